@@ -2,9 +2,9 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import os
 import json # Keep for potential future use, though not actively used in main flow
 import collections # Keep for potential future use with PandasDataAnalyst
-import io # Added for in-memory Parquet conversion
 from datetime import datetime
 
 from langchain_community.chat_message_histories import StreamlitChatMessageHistory
@@ -12,6 +12,12 @@ from langchain_openai import ChatOpenAI
 # Assuming ai_data_science_team is a custom library you have for Tab 2
 from ai_data_science_team import PandasDataAnalyst, DataWranglingAgent, DataVisualizationAgent
 
+from dashboard_data import (ALTERATION_MARKERS, DATASET_EXTENSIONS, DatasetRegistry, add_alteration_columns,
+                            compact_dtypes, list_datasets, read_dataset, top_altered_exams, upload_key)
+
+# Server-side results directory (outputs of unimed.py, CSV/Parquet/Arrow), opened without browser upload
+RESULTS_DIR = os.environ.get("UNIMED_RESULTS_DIR", "resultados")
+
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
     page_title="Painel Inteligente Unimed",
@@ -91,11 +97,19 @@ with st.sidebar:
     api_key = st.text_input("Chave da API da OpenAI", type="password", help="Insira sua chave da API OpenAI para ativar os recursos de IA.")
     model_option = st.selectbox("Modelo OpenAI", ["gpt-4o-mini", "gpt-3.5-turbo", "gpt-4"], index=0)
 
-    st.markdown("<h2 style='color: #006633;'>📁 Upload de Dados</h2>", unsafe_allow_html=True)
-    uploaded_file = st.file_uploader(
-        "Escolha um arquivo CSV com os resultados laboratoriais:",
-        type=["csv"],
-        help="O arquivo CSV deve conter colunas com resultados de exames e colunas com sufixo '_status' indicando alterações (↑, ↓)."
+    st.markdown("<h2 style='color: #006633;'>📁 Dados</h2>", unsafe_allow_html=True)
+    catalog = list_datasets(RESULTS_DIR)
+    selected_entry = st.selectbox(
+        "Resultados no servidor:",
+        [None] + catalog,  # None = upload pelo navegador
+        index=1 if catalog else 0,
+        format_func=lambda entry: "⬆️ Enviar arquivo do computador" if entry is None else entry.label(),
+        help=f"Arquivos CSV/Parquet/Arrow gerados pelo unimed.py na pasta '{RESULTS_DIR}' do servidor (variável UNIMED_RESULTS_DIR), do mais recente ao mais antigo. São lidos direto do disco, sem upload."
+    )
+    uploaded_file = None if selected_entry else st.file_uploader(
+        "Escolha um arquivo CSV, Parquet ou Arrow com os resultados laboratoriais:",
+        type=[ext.lstrip(".") for ext in DATASET_EXTENSIONS],
+        help="Saída do unimed.py (CSV ou Parquet no layout largo): colunas com resultados de exames e colunas com sufixo '_status' indicando alterações (↑, ↓)."
     )
 
 if not api_key:
@@ -120,33 +134,31 @@ if api_key:
         st.error(f"Erro ao inicializar os modelos de IA: {e}. Verifique sua chave da API.")
         st.stop()
 
-if not uploaded_file:
-    st.info("⬆️ Envie um arquivo CSV com resultados de exames para prosseguir e visualizar o painel.")
+if not uploaded_file and not selected_entry:
+    st.info("⬆️ Escolha um resultado do servidor ou envie um arquivo CSV, Parquet ou Arrow com resultados de exames para prosseguir e visualizar o painel.")
     st.stop()
 
 # --- GLOBAL DEFINITIONS ---
-ALTERATION_MARKERS = ["↑", "↓", "Alto", "Baixo", "Aumentado", "Diminuído", "Positivo"]
+# ALTERATION_MARKERS vem de dashboard_data
 
 # --- DATA LOADING AND PREPROCESSING ---
-@st.cache_data
-def load_data(file):
-    # 1. Read the uploaded CSV file into a pandas DataFrame
-    df_csv = pd.read_csv(file)
-
-    # 2. Convert the DataFrame to Parquet format in-memory
-    # This step adds the CSV -> Parquet conversion.
-    # The resulting DataFrame (df_loaded) is read from this in-memory Parquet format.
-    # Subsequent operations in the app will use this Parquet-loaded DataFrame.
-    # The @st.cache_data decorator will cache the final df_loaded and status_cols_local.
-    st.markdown("ℹ️ Convertendo CSV para formato Parquet otimizado...") # User feedback
-    parquet_buffer = io.BytesIO()
-    df_csv.to_parquet(parquet_buffer, index=False)
-    parquet_buffer.seek(0) # Reset buffer's position to the beginning
-    df_loaded = pd.read_parquet(parquet_buffer)
-    st.markdown("✅ Conversão para Parquet concluída.") # User feedback
-
-
-    # Original preprocessing steps continue from here, operating on the Parquet-loaded df_loaded
+# Memory budget for datasets shared across sessions (least recently used evicted first)
+DATASET_CACHE_MB = 2048
+
+@st.cache_resource
+def get_dataset_registry():
+    # One registry per server process: each dataset is parsed once and the same
+    # frame is shared by every session (st.cache_data would pickle a copy per hit)
+    return DatasetRegistry(max_bytes=DATASET_CACHE_MB * 1024 * 1024)
+
+def load_data(file, name):
+    # Read the upload straight into a DataFrame: Parquet/Arrow natively, CSV with
+    # the pyarrow reader and dtypes from the column naming (see dashboard_data).
+    # Server files (paths) are memory-mapped. Called by the registry only the
+    # first time this content is seen, so no st.* calls here: warnings about
+    # missing columns are shown per session after the registry lookup.
+    df_loaded = read_dataset(file, name)
+
     df_loaded.columns = df_loaded.columns.str.lower().str.replace(' ', '_')
     if "data_nascimento" in df_loaded.columns:
         df_loaded["data_nascimento"] = pd.to_datetime(
@@ -159,42 +171,47 @@ def load_data(file):
             lambda x: current_year - x.year if pd.notnull(x) and x.year > 1900 else None
         )
     elif "idade" not in df_loaded.columns:
-        st.warning("Coluna 'data_nascimento' ou 'idade' não encontrada. A funcionalidade de filtro por idade pode não funcionar.")
         df_loaded["idade"] = None
 
+    # Status/ref columns as categoricals, exam values as float32 where exact:
+    # the shared frame shrinks several-fold
+    df_loaded = compact_dtypes(df_loaded)
+
     status_cols_local = [col for col in df_loaded.columns if col.endswith("_status")]
-    if status_cols_local:
-        df_loaded["paciente_com_alteracao"] = df_loaded[status_cols_local].apply(lambda row: row.isin(ALTERATION_MARKERS).any(), axis=1)
-        df_loaded["qtde_exames_alterados"] = df_loaded[status_cols_local].apply(lambda row: sum(row.isin(ALTERATION_MARKERS)), axis=1)
-    else:
-        df_loaded["paciente_com_alteracao"] = False
-        df_loaded["qtde_exames_alterados"] = 0
-        st.warning("Nenhuma coluna '_status' encontrada. Funcionalidades de alteração podem não funcionar corretamente.")
-    return df_loaded, status_cols_local
+    # One boolean mask (patients x status columns) gives the per-patient flag and
+    # count here, and the per-exam counts later (see dashboard_data)
+    alteration_mask_local = add_alteration_columns(df_loaded, status_cols_local, ALTERATION_MARKERS)
+    return df_loaded, status_cols_local, alteration_mask_local
 
 try:
-    df, status_cols = load_data(uploaded_file)
+    if selected_entry:
+        dataset = get_dataset_registry().get(
+            selected_entry.key, lambda: load_data(selected_entry.path, selected_entry.name)
+        )
+    else:
+        dataset = get_dataset_registry().get(
+            upload_key(uploaded_file.getvalue(), uploaded_file.name),
+            lambda: load_data(uploaded_file, uploaded_file.name),
+        )
+    # Shallow per-session view: filters build new frames, the shared data is never written
+    df, status_cols, alteration_mask = dataset.session_view(), list(dataset.status_cols), dataset.mask
 except Exception as e:
     st.error(f"Erro ao carregar ou processar o arquivo: {e}")
     st.stop()
 
-if not status_cols and uploaded_file:
-    st.error("Nenhuma coluna de status de exame (terminada em '_status') foi encontrada no arquivo após o processamento. Verifique o formato do CSV. Algumas funcionalidades de insights podem não funcionar como esperado.")
+# Checked on every run (the loader above runs once per server for each dataset)
+if "data_nascimento" not in df.columns and df["idade"].isna().all():
+    st.warning("Coluna 'data_nascimento' ou 'idade' não encontrada. A funcionalidade de filtro por idade pode não funcionar.")
+if not status_cols:
+    st.warning("Nenhuma coluna '_status' encontrada. Funcionalidades de alteração podem não funcionar corretamente.")
+
+if not status_cols:
+    st.error("Nenhuma coluna de status de exame (terminada em '_status') foi encontrada no arquivo após o processamento. Verifique o formato do arquivo. Algumas funcionalidades de insights podem não funcionar como esperado.")
 
 # --- HELPER FUNCTION TO CALCULATE TOP ALTERED EXAMS (from second script) ---
 def calculate_top_altered_exams(dataframe, status_column_list, markers):
-    if dataframe.empty or not status_column_list:
-        return pd.DataFrame(columns=["Exame", "Número de Alterações"])
-    alteracoes = collections.Counter()
-    for col in status_column_list:
-        if col in dataframe.columns: # Ensure column exists
-            exam_name = col.replace("_status", "").replace("_", " ").title()
-            alteracoes[exam_name] += dataframe[col].isin(markers).sum()
-    if alteracoes:
-        df_top_altered = pd.DataFrame.from_dict(alteracoes, orient="index", columns=["Número de Alterações"])
-        df_top_altered = df_top_altered.sort_values(by="Número de Alterações", ascending=False).reset_index().rename(columns={"index": "Exame"})
-        return df_top_altered[df_top_altered["Número de Alterações"] > 0] # Filter out exams with 0 alterations
-    return pd.DataFrame(columns=["Exame", "Número de Alterações"])
+    # Counts come from the load-time alteration mask (rows of `dataframe` are a subset of df)
+    return top_altered_exams(dataframe, status_column_list, markers, mask=alteration_mask)
 
 # Calculate top altered exams for the global dataset
 top_alterados_df = calculate_top_altered_exams(df, status_cols, ALTERATION_MARKERS)
@@ -329,7 +346,7 @@ with tab1:
 
     st.markdown("### 🔬 Filtros Detalhados e Visualização de Dados (Interativo)")
 
-    df_filtrado_tab1 = df.copy() # Initialize df_filtrado_tab1 for Tab 1 filters
+    df_filtrado_tab1 = df # Initialize df_filtrado_tab1 for Tab 1 filters (each filter returns a new frame)
 
     with st.expander("🔬 Ajuste os Filtros para Refinar sua Análise:", expanded=True):
         col_filt1, col_filt2 = st.columns([1, 2])
@@ -570,7 +587,7 @@ with tab1:
             # Age distribution by alteration status
             if "idade" in df_filtrado_tab1.columns and "paciente_com_alteracao" in df_filtrado_tab1.columns and df_filtrado_tab1["idade"].notna().any():
                 if not df_filtrado_tab1.empty: # Ensure data exists for plotting
-                    df_copy_for_plot = df_filtrado_tab1.copy() # Avoid modifying the filtered df
+                    df_copy_for_plot = df_filtrado_tab1.copy(deep=False) # New column only on the copy, data shared
                     df_copy_for_plot['status_alteracao_label'] = df_copy_for_plot['paciente_com_alteracao'].map({True: 'Com Alteração', False: 'Sem Alteração'})
 
                     fig_age_alt = px.histogram(
@@ -631,7 +648,7 @@ with tab1:
                 exam1_name = exam1_key.replace("_", " ").title()
                 exam2_name = exam2_key.replace("_", " ").title()
 
-                df_copy_for_scatter = df_filtrado_tab1.copy()
+                df_copy_for_scatter = df_filtrado_tab1.copy(deep=False)
                 color_option_scatter = None
                 color_discrete_map_scatter = None
                 title_suffix_scatter = ""
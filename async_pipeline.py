@@ -0,0 +1,182 @@
+import time
+import asyncio
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from corpus_reader import decode_text, read_member_bytes
+from unimed import extract_text_from_pdf, process_text_content
+
+# Pipeline em estágios para process_directory(pipeline="async"):
+#
+#   leitura (threads, I/O) -> texto do PDF (pool) -> regex/referência (pool) -> escrita em ordem
+#
+# Cada estágio roda em paralelo com os outros, ligado ao seguinte por uma fila
+# limitada: enquanto o disco (ou o compartilhamento de rede) entrega os
+# próximos arquivos, os núcleos seguem extraindo e casando padrões. Uma
+# janela de `window` laudos em aberto limita a memória: a leitura só começa o
+# laudo i quando o i - window já foi gravado, então o buffer de reordenação
+# da escrita também fica limitado.
+# Um monitor amostra a ocupação das filas; a fila que vive cheia é a entrada
+# do estágio gargalo, a que vive vazia é a saída dele.
+
+STAGES = ("leitura", "texto", "exames", "escrita")
+QUEUES = ("lidos", "textos", "resultados")
+METRICS_INTERVAL = 0.05
+
+
+def _text_stage(path: str, data: bytes, pages: str = "all", backend: str = "words") -> str:
+    """Roda no pool: bytes do arquivo -> texto do laudo."""
+    if path.lower().endswith(".txt"):
+        return decode_text(data)
+    return extract_text_from_pdf(path, pages, backend, data=data)
+
+
+def _match_stage(path: str, text: str):
+    """Roda no pool: texto -> dict do paciente (ou None)."""
+    return process_text_content(text)
+
+
+class PipelineMetrics:
+    def __init__(self, capacities: dict):
+        self.capacities = capacities
+        self.samples = {name: [] for name in capacities}
+        self.busy = dict.fromkeys(STAGES, 0.0)
+        self.reorder_max = 0
+        self.elapsed = 0.0
+        self.n_files = 0
+
+    def sample(self, queues: dict) -> None:
+        for name, queue in queues.items():
+            self.samples[name].append(queue.qsize())
+
+    def report(self) -> list[str]:
+        lines = [
+            f"Pipeline: {self.n_files} arquivo(s) em {self.elapsed:.2f}s "
+            f"({self.n_files / self.elapsed if self.elapsed else 0:.1f}/s)",
+            f"{'fila':<11} {'média':>6} {'máx':>4} {'cap':>4} {'% cheia':>8}",
+        ]
+        for name, samples in self.samples.items():
+            cap = self.capacities[name]
+            n = len(samples) or 1
+            full = sum(1 for depth in samples if depth >= cap)
+            lines.append(
+                f"{name:<11} {sum(samples) / n:>6.1f} {max(samples, default=0):>4} {cap:>4} {100 * full / n:>7.0f}%"
+            )
+        lines.append("tempo ocupado por estágio (soma entre tarefas): " + ", ".join(
+            f"{stage} {secs:.2f}s" for stage, secs in self.busy.items()
+        ))
+        lines.append(f"buffer de reordenação: máx {self.reorder_max}")
+        return lines
+
+
+async def _run(members, handle, workers, pages, backend, prefetch, read_threads, window):
+    loop = asyncio.get_running_loop()
+    queues = {name: asyncio.Queue(maxsize=prefetch if name == "lidos" else workers) for name in QUEUES}
+    metrics = PipelineMetrics({name: queue.maxsize for name, queue in queues.items()})
+    in_window = asyncio.Semaphore(window)
+    next_member = enumerate(members)  # compartilhado pelos leitores: cada membro sai uma vez só
+    next_lock = asyncio.Lock()        # um gerador não pode avançar em duas threads ao mesmo tempo
+    done = asyncio.Event()
+
+    async def timed(stage, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            metrics.busy[stage] += time.perf_counter() - start
+
+    async def reader():
+        while True:
+            await in_window.acquire()
+            # O próximo membro sai do gerador numa thread: listar um ZIP ou
+            # descomprimir um tar também é I/O
+            async with next_lock:
+                item = await asyncio.to_thread(next, next_member, None)
+            if item is None:
+                in_window.release()
+                return
+            seq, member = item
+            path = member.name
+            try:
+                data = await timed("leitura", asyncio.to_thread(read_member_bytes, member))
+                await queues["lidos"].put((seq, path, data, None))
+            except Exception as e:
+                await queues["lidos"].put((seq, path, None, f"{type(e).__name__}: {e}"))
+
+    async def worker(stage, source, target, func):
+        while True:
+            item = await queues[source].get()
+            if item is None:
+                break
+            seq, path, payload, erro = item
+            if erro is None:
+                try:
+                    payload = await timed(stage, loop.run_in_executor(executor, func, path, payload))
+                except Exception as e:
+                    payload, erro = None, f"{type(e).__name__}: {e}"
+            await queues[target].put((seq, path, payload, erro))
+
+    async def writer():
+        pending = {}
+        expected = 0
+        while True:
+            item = await queues["resultados"].get()
+            if item is None:  # todos os exames terminaram: nada mais pendente
+                break
+            seq, path, resultado, erro = item
+            pending[seq] = (path, resultado, erro)
+            while expected in pending:
+                path, resultado, erro = pending.pop(expected)
+                start = time.perf_counter()
+                handle(path, resultado, erro)
+                metrics.busy["escrita"] += time.perf_counter() - start
+                in_window.release()
+                expected += 1
+            metrics.reorder_max = max(metrics.reorder_max, len(pending))
+        metrics.n_files = expected
+
+    async def monitor():
+        while not done.is_set():
+            metrics.sample(queues)
+            await asyncio.sleep(METRICS_INTERVAL)
+
+    async def close(tasks, queue_name, n_consumers):
+        await asyncio.gather(*tasks)
+        for _ in range(n_consumers):
+            await queues[queue_name].put(None)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        monitor_task = asyncio.create_task(monitor())
+        readers = [asyncio.create_task(reader()) for _ in range(read_threads)]
+        texters = [
+            asyncio.create_task(worker("texto", "lidos", "textos", partial(_text_stage, pages=pages, backend=backend)))
+            for _ in range(workers)
+        ]
+        matchers = [
+            asyncio.create_task(worker("exames", "textos", "resultados", _match_stage))
+            for _ in range(workers)
+        ]
+        await asyncio.gather(
+            close(readers, "lidos", len(texters)),
+            close(texters, "textos", len(matchers)),
+            close(matchers, "resultados", 1),
+            writer(),
+        )
+        done.set()
+        await monitor_task
+    metrics.elapsed = time.perf_counter() - start
+    return metrics
+
+
+def run_pipeline(members, handle, workers: int = 1, pages: str = "all", backend: str = "words",
+                 prefetch: int = 8, read_threads: int = 4, window: int | None = None) -> PipelineMetrics:
+    """
+    Processa os membros de corpus (corpus_reader.iter_members) pelo pipeline
+    e chama handle(nome, resultado, erro) na ordem de `members`, como
+    iter_corpus_results. Falhas ficam isoladas por arquivo.
+    prefetch: arquivos lidos à frente; read_threads: leituras simultâneas.
+    Retorna as métricas (ocupação das filas, tempo por estágio).
+    """
+    window = window or prefetch + 4 * workers
+    return asyncio.run(_run(members, handle, workers, pages, backend, prefetch, read_threads, window))
@@ -0,0 +1,201 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+
+from remove_patient import anonymize_text, extract_text_from_pdf, iter_anonymized
+import synthetic_laudos
+
+# Benchmark + verificação de vazamento do anonimizador (remove_patient.py)
+# sobre PDFs sintéticos, sem nenhum dado real. Cada laudo recebe
+# identificadores conhecidos, em linhas próprias como nos laudos reais:
+#   • bloco do paciente: nome, RG, código da OS, DN, CPF, médico solicitante
+#   • rodapé de cada página: "Liberado/Assinado eletronicamente por <nome>"
+#     + linha do CRM, hash hexadecimal da assinatura, "ASSINATURA DIGITAL",
+#     cabeçalhos da unidade (Unidade:, Responsável Técnico:, ...)
+# Etapas cronometradas em série (pdf: PDF -> texto; filtro: anonymize_text)
+# e o pipeline completo (iter_anonymized, com --workers) em páginas/s.
+# Depois confere, na saída do pipeline, que nenhum identificador sobreviveu
+# e que os resultados dos exames continuam lá. Sai com código 1 se vazar.
+
+SECTIONS_PER_PAGE = 30
+HEX_DIGITS = "0123456789ABCDEF"
+UNITS = ["CENTRO", "PAMPULHA", "SAVASSI", "BARREIRO", "VENDA NOVA"]
+
+
+def _person(rng: random.Random, title: str) -> str:
+    return f"{title} {rng.choice(synthetic_laudos.FIRST_NAMES)} {rng.choice(synthetic_laudos.LAST_NAMES)}"
+
+
+def make_anon_laudo(rng: random.Random, n_tests: int = 20, pages: int = 1) -> dict:
+    """
+    Laudo sintético com identificadores injetados.
+    Retorna {"pages", "identifiers" (tipo -> valor), "values" (resultados que devem ficar)}.
+    """
+    patient = synthetic_laudos.make_patient(rng)
+    signer = _person(rng, "DR")
+    identifiers = {
+        "nome": patient["nome"],
+        "rg": patient["rg"],
+        "codigo_os": patient["codigo_os"],
+        "dn": patient["data_nascimento"],
+        "cpf": patient["cpf"],
+        "medico": patient["medico"],
+        "assinante": signer,
+        "crm": f"CRM-MG {rng.randint(10000, 99999)}",
+        "hash": "".join(rng.choice(HEX_DIGITS) for _ in range(64)),
+        "responsavel": _person(rng, "DRA"),
+    }
+
+    tests = rng.sample(synthetic_laudos.SUPPORTED_TESTS, min(n_tests, len(synthetic_laudos.SUPPORTED_TESTS)))
+    sections, values = [], []
+    for test_name in tests:
+        pattern_str, group_map = synthetic_laudos.SAMPLERS[test_name]
+        snippet, value = synthetic_laudos.sample_for_pattern(test_name, pattern_str, group_map, rng)
+        sections.append(snippet)
+        values.append(value)
+
+    header = "\n".join([
+        f"Unidade : {rng.choice(UNITS)}",
+        f"Nome : {patient['nome']}",
+        f"RG : {patient['rg']}",
+        f"Código da OS : {patient['codigo_os']}",
+        f"DN : {patient['data_nascimento']}",
+        f"CPF : {patient['cpf']}",
+        f"Médico : {patient['medico']}",
+        f"Atendimento : {patient['atendimento']}",
+        f"Convênio: {patient['convenio']}",
+        f"Qnt de exames: {len(tests)}",
+    ])
+    footer = "\n".join([
+        f"Liberado eletronicamente por {signer}",
+        identifiers["crm"],
+        "ASSINATURA DIGITAL",
+        identifiers["hash"],
+        f"Responsável Técnico: {identifiers['responsavel']}",
+        "Endereço da Unidade: Av. Afonso Pena, 1000",
+        "Laboratório inscrito sob CRM 0000",
+    ])
+    chunks = [sections[i:i + SECTIONS_PER_PAGE] for i in range(0, len(sections), SECTIONS_PER_PAGE)] or [[]]
+    chunks += [[]] * (pages - len(chunks))
+    page_texts = [header + "\n" + "\n".join(chunk) + "\n" + footer for chunk in chunks]
+    return {"pages": page_texts, "identifiers": identifiers, "values": values}
+
+
+def find_leaks(text: str, identifiers: dict) -> list[str]:
+    """Tipos de identificador presentes no texto (comparação sem caixa)."""
+    folded = text.upper()
+    return [kind for kind, value in identifiers.items() if value.upper() in folded]
+
+
+def run_benchmark(laudos, pdf_paths, pdf_dir: str, workers: int = 1) -> dict:
+    """
+    Mede as etapas em série e o pipeline completo, e confere vazamentos.
+    Retorna {"docs", "pages", "stages", "pipeline", "injected", "leaks", "kept", "failures"}.
+    """
+    stages = {"pdf": 0.0, "filtro": 0.0}
+    injected = [0, 0]  # identificadores presentes no texto do PDF, identificadores gerados
+    for laudo, path in zip(laudos, pdf_paths):
+        start = time.perf_counter()
+        raw_text = extract_text_from_pdf(path)
+        stages["pdf"] += time.perf_counter() - start
+        start = time.perf_counter()
+        anonymize_text(raw_text)
+        stages["filtro"] += time.perf_counter() - start
+        injected[0] += len(find_leaks(raw_text, laudo["identifiers"]))
+        injected[1] += len(laudo["identifiers"])
+
+    start = time.perf_counter()
+    outputs = {name: (text, erro) for name, text, erro in iter_anonymized(pdf_dir, workers)}
+    pipeline = time.perf_counter() - start
+
+    leaks, failures = [], []
+    kept = [0, 0]
+    for laudo, path in zip(laudos, pdf_paths):
+        name = os.path.splitext(os.path.basename(path))[0] + ".txt"
+        text, erro = outputs.get(name, (None, "saída ausente"))
+        if erro:
+            failures.append(f"{name}: {erro}")
+            continue
+        leaks += [(name, kind, laudo["identifiers"][kind]) for kind in find_leaks(text, laudo["identifiers"])]
+        kept[0] += sum(value in text for value in laudo["values"])
+        kept[1] += len(laudo["values"])
+
+    return {
+        "docs": len(laudos),
+        "pages": sum(len(laudo["pages"]) for laudo in laudos),
+        "workers": workers,
+        "stages": stages,
+        "pipeline": pipeline,
+        "injected": tuple(injected),
+        "leaks": leaks,
+        "kept": tuple(kept),
+        "failures": failures,
+    }
+
+
+def format_report(report: dict, max_leaks: int = 20) -> list[str]:
+    n, pages = report["docs"], report["pages"]
+    lines = [f"Laudos: {n}   páginas: {pages}", ""]
+    lines.append(f"{'etapa':<10} {'total (s)':>10} {'ms/página':>10} {'páginas/s':>10}")
+    for stage, secs in report["stages"].items():
+        lines.append(f"{stage:<10} {secs:>10.3f} {1000 * secs / pages:>10.3f} {pages / secs if secs else 0:>10.1f}")
+    secs = report["pipeline"]
+    lines.append(
+        f"{'pipeline':<10} {secs:>10.3f} {1000 * secs / pages:>10.3f} {pages / secs if secs else 0:>10.1f}"
+        f"   ({report['workers']} processo(s))"
+    )
+
+    present, generated = report["injected"]
+    kept, values = report["kept"]
+    lines += [
+        "",
+        f"Identificadores injetados: {present}/{generated} presentes no texto dos PDFs",
+        f"Resultados de exames preservados: {kept}/{values}",
+        f"Vazamentos: {len(report['leaks'])}",
+    ]
+    for name, kind, value in report["leaks"][:max_leaks]:
+        lines.append(f"  {name}: {kind} = {value}")
+    if report["failures"]:
+        lines += [f"Falhas ({len(report['failures'])}):"] + [f"  {f}" for f in report["failures"]]
+    return lines
+
+
+# ---------- main -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark e verificação de vazamento do anonimizador.")
+    parser.add_argument("-n", "--docs", type=int, default=100)
+    parser.add_argument("--tests-per-doc", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=1, help="Mínimo de páginas por laudo.")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Processos no pipeline completo (0 = todos os núcleos).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=None, help="Grava o relatório também neste arquivo.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    laudos = [make_anon_laudo(rng, args.tests_per_doc, args.pages) for _ in range(args.docs)]
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_paths = []
+        for i, laudo in enumerate(laudos):
+            path = os.path.join(tmp, f"laudo_{i:06d}.pdf")
+            synthetic_laudos.write_pdf(laudo, path)
+            pdf_paths.append(path)
+        report = run_benchmark(laudos, pdf_paths, tmp, args.workers or os.cpu_count() or 1)
+
+    lines = format_report(report)
+    print("\n".join(lines))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    present, generated = report["injected"]
+    if report["leaks"] or report["failures"] or present < generated:
+        print("❌ Anonimização não verificada (vazamento, falha ou identificador não injetado).")
+        sys.exit(1)
+    print("✅ Nenhum identificador sobreviveu.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+
+from pattern_engine import iter_test_matches
+from pattern_profile import PatternProfiler
+from result_writers import open_results_writer
+from unimed import PACIENTE_REGEX, age_from_birth_date, check_reference, extract_text_from_pdf, normalize_number
+import synthetic_laudos
+
+# Benchmark da extração sobre laudos sintéticos (synthetic_laudos.py), sem
+# nenhum PDF real. Cada etapa é cronometrada separadamente:
+#   pdf      PDF -> texto (PyMuPDF), só com --pdf
+#   paciente regex do cabeçalho do paciente
+#   exames   regexes de TEST_PATTERNS (custo por padrão via pattern_profile)
+#   ref      check_reference de cada valor encontrado
+#   csv      gravação do resultado com o writer de streaming
+# As etapas são chamadas uma a uma (e não via process_text_content) para que o
+# tempo de cada uma apareça isolado; o sexo vem do gerador, já que a lista de
+# nomes de process_text_content só conhece pacientes reais.
+# Também confere o recall: quantos valores injetados o extrator recuperou.
+# E a segmentação em seções: nenhum valor esperado que a busca no texto
+# inteiro acha pode sumir na busca por seção (--adjacent gera exames colados,
+# sem texto entre eles; ADJACENT_CASES são casos fixos do mesmo tipo). Sai
+# com código 1 se algum sumir.
+
+# Exames colados cujo título seguinte não termina numa âncora: o recuo do
+# título não pode engolir o valor/unidade do exame anterior.
+ADJACENT_CASES = [
+    (
+        "TRANSAMINASE PIRÚVICA TGP (ALT) Método: Cinético UV RESULTADO: 25 U/L "
+        "HEMOGRAMA Método: Automatizado RESULTADO: ver abaixo ",
+        {"TRANSAMINASE PIRÚVICA TGP (ALT)": "25"},
+    ),
+    (
+        "SANGUE OCULTO - PESQUISA Método: Imunocromatografia RESULTADO: NEGATIVA "
+        "VITAMINA D3 25-HIDROXI (25-OH) Método: Quimioluminescência RESULTADO: 30,0 ng/mL ",
+        {"SANGUE OCULTO - PESQUISA": "NEGATIVA", "VITAMINA D3 25-HIDROXI": "30,0"},
+    ),
+]
+
+STAGES = ("pdf", "paciente", "exames", "ref", "csv")
+
+
+def _match_tests(text: str, profiler: PatternProfiler):
+    """(exame, valor bruto) de cada padrão que casou, com o custo de cada padrão no profiler."""
+    return [
+        (test_name, match.group(group_map["value_group"]).strip())
+        for test_name, match, group_map in iter_test_matches(text, profiler)
+    ]
+
+
+def _found_values(text: str, sectioned: bool) -> dict:
+    values = {}
+    for name, match, group_map in iter_test_matches(text, sectioned=sectioned):
+        values.setdefault(name, match.group(group_map["value_group"]).strip())
+    return values
+
+
+def section_losses(cases) -> list[tuple[int, str, str]]:
+    """
+    (índice do caso, exame, valor esperado) que a busca no texto inteiro
+    acha e a busca por seção perde. `cases` = [(texto, {exame: valor})].
+    """
+    losses = []
+    for i, (text, expected) in enumerate(cases):
+        flat, sectioned = _found_values(text, False), _found_values(text, True)
+        for name, value in expected.items():
+            if flat.get(name) == value and sectioned.get(name) != value:
+                losses.append((i, name, value))
+    return losses
+
+
+def run_benchmark(laudos, pdf_paths=None, output_dir=None):
+    """
+    Roda as etapas sobre `laudos` (saída de synthetic_laudos.make_laudo).
+    Com `pdf_paths` (um PDF por laudo), o texto vem do PDF e a etapa "pdf" é medida.
+    Retorna {"docs", "stages" (segundos), "patterns" (PatternProfiler), "recall" (achados, injetados)}.
+    """
+    stages = dict.fromkeys(STAGES, 0.0)
+    profiler = PatternProfiler()
+    injected = recovered = 0
+    rows = []
+
+    for i, laudo in enumerate(laudos):
+        if pdf_paths:
+            start = time.perf_counter()
+            text = extract_text_from_pdf(pdf_paths[i])
+            stages["pdf"] += time.perf_counter() - start
+        else:
+            text = laudo["text"]
+        profiler.start_document(i)
+
+        start = time.perf_counter()
+        paciente = PACIENTE_REGEX.search(text)
+        stages["paciente"] += time.perf_counter() - start
+        age = age_from_birth_date(paciente.group(4).strip()) if paciente else None
+        gender = laudo["patient"]["sexo"]
+
+        start = time.perf_counter()
+        found = _match_tests(text, profiler)
+        stages["exames"] += time.perf_counter() - start
+
+        row = {"nome": laudo["patient"]["nome"], "idade": age, "sexo": gender}
+        start = time.perf_counter()
+        for test_name, value_raw in found:
+            value = normalize_number(value_raw)
+            status, ref_str = check_reference(test_name, value, age, gender)
+            row[test_name] = value
+            row[f"{test_name}_status"] = status
+            row[f"{test_name}_ref"] = ref_str
+        stages["ref"] += time.perf_counter() - start
+        rows.append(row)
+
+        values = {}
+        for test_name, value_raw in found:
+            values.setdefault(test_name, normalize_number(value_raw))
+        for test_name, expected in laudo["expected"].items():
+            injected += 1
+            recovered += values.get(test_name) == normalize_number(expected)
+
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmp:
+        start = time.perf_counter()
+        with open_results_writer(os.path.join(tmp, "bench.csv")) as writer:
+            for row in rows:
+                writer.write(row)
+        stages["csv"] += time.perf_counter() - start
+
+    return {
+        "docs": len(laudos),
+        "stages": stages,
+        "patterns": profiler,
+        "recall": (recovered, injected),
+        "section_losses": section_losses(ADJACENT_CASES + [(laudo["text"], laudo["expected"]) for laudo in laudos]),
+    }
+
+
+def format_report(report: dict, top: int = 15) -> list[str]:
+    n = report["docs"]
+    total = sum(report["stages"].values())
+    lines = [f"Laudos: {n}   tempo total: {total:.3f}s   {n / total if total else 0:.1f} laudos/s", ""]
+    lines.append(f"{'etapa':<10} {'total (s)':>10} {'ms/laudo':>10} {'%':>6}")
+    for stage in STAGES:
+        secs = report["stages"][stage]
+        if stage == "pdf" and not secs:
+            continue
+        lines.append(f"{stage:<10} {secs:>10.3f} {1000 * secs / n:>10.3f} {100 * secs / total if total else 0:>6.1f}")
+
+    recovered, injected = report["recall"]
+    lines += ["", f"Recall: {recovered}/{injected} valores injetados recuperados"]
+    losses = report["section_losses"]
+    lines.append(f"Exames perdidos na busca por seção: {len(losses)}")
+    for i, name, value in losses[:top]:
+        lines.append(f"  caso {i}: {name} = {value}")
+    lines.append("")
+
+    lines.append(f"Padrões mais caros (top {top}):")
+    lines += report["patterns"].report(top)
+    return lines
+
+
+# ---------- main -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da extração com laudos sintéticos.")
+    parser.add_argument("-n", "--docs", type=int, default=200)
+    parser.add_argument("--tests-per-doc", type=int, default=30)
+    parser.add_argument("--tests", default=None, help="Mix fixo de exames, separados por ';'.")
+    parser.add_argument("--pages", type=int, default=1, help="Mínimo de páginas por laudo.")
+    parser.add_argument("--pdf", action="store_true", help="Gera PDFs e mede também PDF -> texto.")
+    parser.add_argument("--adjacent", action="store_true", help="Exames colados, sem texto de rodapé entre eles.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("-o", "--output", default=None, help="Grava o relatório também neste arquivo.")
+    args = parser.parse_args()
+
+    tests = args.tests.split(";") if args.tests else None
+    kwargs = dict(tests=tests, n_tests=args.tests_per_doc, pages=args.pages, boilerplate=not args.adjacent)
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.pdf:
+            written = synthetic_laudos.write_corpus(tmp, args.docs, pdf=True, seed=args.seed, **kwargs)
+            pdf_paths = [path for path, _ in written]
+            laudos = [laudo for _, laudo in written]
+        else:
+            rng = random.Random(args.seed)
+            laudos = [synthetic_laudos.make_laudo(rng, **kwargs) for _ in range(args.docs)]
+            pdf_paths = None
+        report = run_benchmark(laudos, pdf_paths)
+
+    lines = format_report(report, args.top)
+    print("\n".join(lines))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    if report["section_losses"]:
+        print("❌ A segmentação em seções perdeu exames que a busca no texto inteiro acha.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
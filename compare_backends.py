@@ -0,0 +1,132 @@
+import os
+import time
+import random
+import difflib
+import argparse
+
+from pattern_engine import iter_test_matches
+from unimed import PAGE_MODES, TEXT_BACKENDS, extract_text_from_pdf, list_input_files
+
+# Valida um backend de texto alternativo contra o "words" (referência) numa
+# amostra de PDFs: compara o texto extraído palavra a palavra e, o que
+# importa de verdade, os valores de exame que as regexes (iter_test_matches)
+# tiram de cada um. Gera um relatório com tempos, arquivos divergentes, os
+# exames que mudaram e os PDFs que falharam (ilegíveis), sem parar a amostra.
+
+CONTEXT_WORDS = 6
+MAX_HUNKS = 5
+
+
+def _word_diff(reference: str, candidate: str) -> list[str]:
+    """Primeiros trechos divergentes, em palavras, com um pouco de contexto."""
+    ref_words, cand_words = reference.split(), candidate.split()
+    hunks = []
+    matcher = difflib.SequenceMatcher(a=ref_words, b=cand_words, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        before = " ".join(ref_words[max(0, i1 - CONTEXT_WORDS):i1])
+        hunks.append(
+            f"    … {before} [-{' '.join(ref_words[i1:i2])}-] {{+{' '.join(cand_words[j1:j2])}+}}"
+        )
+        if len(hunks) >= MAX_HUNKS:
+            break
+    return hunks
+
+
+def _exam_values(text: str) -> dict:
+    """Exame -> valor bruto (o primeiro match de cada exame, como em process_text_content)."""
+    values = {}
+    for test_name, match, group_map in iter_test_matches(text):
+        values.setdefault(test_name, match.group(group_map["value_group"]).strip())
+    return values
+
+
+def _result_diff(reference: dict, candidate: dict) -> list[str]:
+    changed = []
+    for key in sorted(set(reference) | set(candidate)):
+        if reference.get(key) != candidate.get(key):
+            changed.append(f"    {key}: {reference.get(key)!r} -> {candidate.get(key)!r}")
+    return changed
+
+
+def _timed_extract(path, pages, backend):
+    start = time.perf_counter()
+    text = extract_text_from_pdf(path, pages, backend)
+    return text, time.perf_counter() - start
+
+
+def compare_backends(paths, candidate="lines", reference="words", pages="all"):
+    """Compara os dois backends em `paths`. Retorna as linhas do relatório."""
+    report = []
+    totals = {reference: 0.0, candidate: 0.0}
+    same_text = same_result = 0
+    failures = []
+
+    for path in paths:
+        try:
+            ref_text, ref_time = _timed_extract(path, pages, reference)
+            cand_text, cand_time = _timed_extract(path, pages, candidate)
+            ref_result = _exam_values(ref_text)
+            cand_result = _exam_values(cand_text)
+        except Exception as e:
+            failures.append(f"• {os.path.basename(path)}: {type(e).__name__}: {e}")
+            continue
+        totals[reference] += ref_time
+        totals[candidate] += cand_time
+
+        text_equal = ref_text.split() == cand_text.split()
+        changed = _result_diff(ref_result, cand_result)
+        same_text += text_equal
+        same_result += not changed
+        if text_equal and not changed:
+            continue
+
+        report.append(f"• {os.path.basename(path)}")
+        if not text_equal:
+            report.append("  texto:")
+            report.extend(_word_diff(ref_text, cand_text))
+        if changed:
+            report.append("  exames:")
+            report.extend(changed)
+
+    n = len(paths) - len(failures)
+    summary = [
+        f"Amostra: {len(paths)} PDF(s), páginas={pages}, falhas={len(failures)}",
+        f"Texto idêntico:      {same_text}/{n}",
+        f"Resultado idêntico:  {same_result}/{n}",
+        f"Tempo {reference:<6} {totals[reference]:.2f}s",
+        f"Tempo {candidate:<6} {totals[candidate]:.2f}s",
+    ]
+    if failures:
+        report += [f"Falhas ({len(failures)}):"] + failures
+    return summary + ([""] + report if report else [])
+
+
+# ---------- main -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Compara backends de extração de texto dos PDFs.")
+    parser.add_argument("pasta")
+    parser.add_argument("-n", "--sample", type=int, default=200, help="Tamanho da amostra (0 = todos).")
+    parser.add_argument("--backend", choices=[b for b in TEXT_BACKENDS if b != "words"], default="lines")
+    parser.add_argument("--pages", choices=PAGE_MODES, default="all")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="backend_diff_report.txt")
+    args = parser.parse_args()
+
+    paths = [p for p in list_input_files(args.pasta) if p.lower().endswith(".pdf")]
+    if args.sample and len(paths) > args.sample:
+        paths = sorted(random.Random(args.seed).sample(paths, args.sample))
+    if not paths:
+        print("❌ Nenhum PDF encontrado.")
+        return
+
+    lines = compare_backends(paths, candidate=args.backend, pages=args.pages)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    print("\n".join(lines[:5]))
+    print(f"✅ Relatório: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import io
+import os
+import tarfile
+import zipfile
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from functools import partial
+
+from packed_corpus import get_corpus, is_packed_corpus
+
+# Leitura uniforme de um corpus de laudos, venha ele de:
+#   • uma pasta (PDF/TXT soltos),
+#   • um ZIP ou um tar (.tar, .tar.gz, .tgz, .tar.xz...),
+#   • um corpus empacotado (packed_corpus, .pack + .idx).
+# Os membros são gerados sob demanda, na ordem do corpus, sem descompactar
+# nada em disco. Cada membro sabe como ser relido (`key`): caminho na pasta,
+# nome no ZIP ou posição no .pack — então um processo do pool reabre o laudo
+# sozinho e só a referência trafega. No tar (stream, sem acesso aleatório) o
+# próprio conteúdo vai junto com o membro.
+
+INPUT_EXTENSIONS = (".pdf", ".txt")
+MAX_PENDING_CHUNKS_PER_WORKER = 4
+
+
+class CorpusMember(NamedTuple):
+    kind: str      # "dir", "zip", "tar" ou "packed"
+    source: str    # caminho do corpus
+    name: str      # nome do laudo dentro do corpus
+    key: object    # caminho (dir), nome no zip, bytes (tar) ou índice (packed)
+
+
+def corpus_kind(path: str) -> str:
+    """Tipo do corpus em `path` ("dir", "packed", "zip" ou "tar")."""
+    if os.path.isdir(path):
+        return "dir"
+    if is_packed_corpus(path):
+        return "packed"
+    if zipfile.is_zipfile(path):
+        return "zip"
+    if tarfile.is_tarfile(path):
+        return "tar"
+    raise ValueError(f"'{path}' não é uma pasta, ZIP, tar nem corpus empacotado")
+
+
+def _wanted(name: str, extensions) -> bool:
+    base = os.path.basename(name)
+    return not base.startswith(".") and base.lower().endswith(extensions)
+
+
+def iter_members(path: str, extensions=INPUT_EXTENSIONS, sort: bool = True):
+    """
+    Gera os CorpusMember do corpus: pasta e ZIP em ordem alfabética, tar e
+    .pack na ordem do arquivo. sort=False mantém o ZIP na ordem do arquivo
+    (namelist) também; a pasta continua em ordem alfabética.
+    """
+    kind = corpus_kind(path)
+    if kind == "dir":
+        with os.scandir(path) as entries:
+            names = sorted(e.name for e in entries if e.is_file() and _wanted(e.name, extensions))
+        for name in names:
+            yield CorpusMember(kind, path, name, os.path.join(path, name))
+    elif kind == "packed":
+        corpus = get_corpus(path)
+        for index in range(len(corpus)):
+            name = corpus.name(index)
+            if _wanted(name, extensions):
+                yield CorpusMember(kind, path, name, index)
+    elif kind == "zip":
+        with zipfile.ZipFile(path) as zf:
+            names = [info.filename for info in zf.infolist() if not info.is_dir() and _wanted(info.filename, extensions)]
+        if sort:
+            names.sort()
+        for name in names:
+            yield CorpusMember(kind, path, name, name)
+    else:
+        # "r|*": leitura em stream, funciona com qualquer compressão sem seek
+        with tarfile.open(path, "r|*") as tf:
+            for info in tf:
+                if info.isfile() and _wanted(info.name, extensions):
+                    yield CorpusMember(kind, path, info.name, tf.extractfile(info).read())
+
+
+# ---------- conteúdo ---------------------------------------------------
+_open_zips = {}
+if hasattr(os, "register_at_fork"):
+    # Um filho do fork (pool de processos) herdaria o descritor e a posição de
+    # leitura do ZipFile do pai: cada processo abre o seu.
+    os.register_at_fork(after_in_child=_open_zips.clear)
+
+
+def _get_zip(path: str) -> zipfile.ZipFile:
+    """Um ZipFile aberto por processo e por arquivo (o diretório central é lido uma vez)."""
+    zf = _open_zips.get(path)
+    if zf is None:
+        zf = _open_zips[path] = zipfile.ZipFile(path)
+    return zf
+
+
+def open_member(member: CorpusMember):
+    """Stream binário do laudo (descompactado sob demanda no ZIP)."""
+    if member.kind == "dir":
+        return open(member.key, "rb")
+    if member.kind == "zip":
+        return _get_zip(member.source).open(member.key)
+    if member.kind == "packed":
+        return io.BytesIO(get_corpus(member.source).view(member.key))
+    return io.BytesIO(member.key)
+
+
+def read_member_bytes(member: CorpusMember) -> bytes:
+    if member.kind == "tar":
+        return member.key
+    if member.kind == "packed":
+        return bytes(get_corpus(member.source).view(member.key))
+    with open_member(member) as f:
+        return f.read()
+
+
+def open_member_text(member: CorpusMember, errors: str = "strict"):
+    """
+    Texto do laudo decodificado aos poucos (iterável linha a linha), com as
+    quebras de linha universais de open() em modo texto.
+    """
+    return io.TextIOWrapper(open_member(member), encoding="utf-8", errors=errors)
+
+
+def decode_text(data: bytes, errors: str = "strict") -> str:
+    """Bytes já lidos -> texto, decodificado como open_member_text."""
+    return io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", errors=errors).read()
+
+
+def read_member_text(member: CorpusMember, errors: str = "strict") -> str:
+    if member.kind == "packed" and errors == "strict":
+        return get_corpus(member.source).text(member.key)  # direto do mmap, como empacotado
+    with open_member_text(member, errors) as f:
+        return f.read()
+
+
+# ---------- fan-out ----------------------------------------------------
+def _run_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def map_chunks(func, members, workers: int = 1, chunksize: int = 16):
+    """
+    func(lote) para cada lote de até `chunksize` membros, um resultado por
+    lote, na ordem de `members` — para agregar dentro do processo (contadores,
+    somas) e devolver só o agregado.
+    Com workers > 1 os lotes vão para um pool de processos, com no máximo
+    MAX_PENDING_CHUNKS_PER_WORKER lotes por processo em aberto
+    (Executor.map consumiria o corpus inteiro de uma vez; aqui o tar, que
+    carrega o conteúdo no membro, continua com memória limitada).
+    `func` precisa ser picklable (função de módulo ou partial).
+    """
+    if workers <= 1:
+        for chunk in _chunks(members, chunksize):
+            yield func(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in _chunks(members, chunksize):
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= workers * MAX_PENDING_CHUNKS_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def map_members(func, members, workers: int = 1, chunksize: int = 16):
+    """func(membro) para cada membro, resultados na ordem de `members` (ver map_chunks)."""
+    if workers <= 1:
+        for member in members:
+            yield func(member)
+        return
+    for results in map_chunks(partial(_run_chunk, func), members, workers, chunksize):
+        yield from results
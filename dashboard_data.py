@@ -0,0 +1,374 @@
+import io
+import os
+import csv
+import hashlib
+import threading
+import collections
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # sem pyarrow: CSV pelo pandas, sem Parquet/Arrow
+    pa = pc = pa_csv = feather = pq = None
+
+from result_writers import PATIENT_COLS
+
+# Preparação dos dados do painel (app3.py), sem dependência do Streamlit.
+#
+# Leitura: o arquivo enviado ou escolhido no catálogo do servidor (CSV,
+# Parquet ou Arrow/Feather, saídas de unimed.process_directory numa pasta de
+# resultados) vira DataFrame numa passada só; arquivos do servidor são lidos
+# por memory map, direto do disco, sem passar pelo navegador. O CSV é lido
+# pelo leitor do pyarrow com os tipos dados pela convenção de nomes das
+# colunas (_status/_ref dictionary-encoded -> categóricas já na leitura;
+# colunas do paciente como texto; valores de exame lidos como texto e
+# convertidos coluna a coluna, inteira, para inteiro/float quando todos os
+# valores são numéricos — o pyarrow inferiria o tipo só pelo primeiro bloco,
+# e uma coluna vazia ou numérica no início com "INFERIOR A 0,5" ou "<0,1"
+# depois derrubaria a leitura); Parquet/Arrow já vêm tipados. A conversão
+# Arrow -> pandas libera o Arrow coluna a coluna (self_destruct), então o
+# pico de memória fica perto do tamanho dos dados.
+#
+# Alterações: uma matriz booleana única (pacientes × colunas _status),
+# calculada uma vez no carregamento com DataFrame.isin (vetorizado, por
+# coluna). Dela saem a flag e a contagem por paciente (any/sum por linha) e,
+# depois, as contagens por exame de qualquer recorte filtrado do DataFrame
+# (sum por coluna nas linhas do recorte), sem reavaliar os status.
+#
+# Tipos compactos: colunas _status (um punhado de valores: ↑ ↓ OK ≠ ?) e _ref
+# (as mesmas poucas strings repetidas) viram categóricas — um código inteiro
+# por célula em vez de um objeto Python; colunas de valor de exame float64
+# viram float32 quando todos os valores sobrevivem à conversão exatamente
+# (inteiros, meios...), para que nada mude na exibição nem nos filtros.
+#
+# Registro compartilhado: um processo do painel atende todas as sessões, então
+# cada dataset (chave = hash do conteúdo enviado, ou caminho+tamanho+mtime de
+# um arquivo do catálogo) é lido e preparado uma vez só e o mesmo DataFrame
+# pronto é entregue a todas as sessões, com uma vista rasa por sessão
+# (df.copy(deep=False): mesmos arrays, colunas novas só na vista). O painel
+# não escreve no DataFrame compartilhado; a máscara de alterações fica
+# somente-leitura. Despejo LRU quando a soma dos tamanhos passa do orçamento
+# (o dataset recém-carregado fica sempre, mesmo sozinho acima dele).
+
+ALTERATION_MARKERS = ["↑", "↓", "Alto", "Baixo", "Aumentado", "Diminuído", "Positivo"]
+STATUS_SUFFIX = "_status"
+REF_SUFFIX = "_ref"
+DATASET_EXTENSIONS = (".csv", ".parquet", ".arrow", ".feather")
+NUMERIC_PATIENT_COLS = ("idade", "quantidade_exames")
+
+
+# ---------- leitura ----------------------------------------------------
+def _csv_header(file) -> list[str]:
+    """Nomes das colunas (primeira linha) sem consumir o arquivo."""
+    start = file.tell()
+    first_line = file.readline()
+    file.seek(start)
+    if isinstance(first_line, bytes):
+        first_line = first_line.decode("utf-8-sig")
+    return next(csv.reader(io.StringIO(first_line)), [])
+
+
+def _arrow_to_pandas(table) -> pd.DataFrame:
+    # split_blocks + self_destruct: cada coluna Arrow é solta assim que convertida
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _empty_to_null(df: pd.DataFrame) -> pd.DataFrame:
+    """Células "" (como o Parquet do unimed grava status/ref ausentes) viram NaN, como no CSV."""
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            if "" in values.cat.categories:
+                df[col] = values.cat.remove_categories([""])
+        elif values.dtype == object:
+            df[col] = values.replace("", np.nan)
+    return df
+
+
+def _read_csv(file, header: list[str]) -> pd.DataFrame:
+    coded = [name for name in header if name.endswith((STATUS_SUFFIX, REF_SUFFIX))]
+    text = [name for name in header if name in PATIENT_COLS and name not in NUMERIC_PATIENT_COLS]
+    if pa is None:
+        return pd.read_csv(file, dtype={**dict.fromkeys(coded, "category"), **dict.fromkeys(text, str)})
+
+    values = [name for name in header if name not in coded and name not in text]
+    column_types = {
+        **dict.fromkeys(coded, pa.dictionary(pa.int32(), pa.string())),
+        **dict.fromkeys(text + values, pa.string()),
+    }
+    table = pa_csv.read_csv(
+        file,
+        convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+    )
+    for name in values:
+        i = table.schema.get_field_index(name)
+        table = table.set_column(i, name, _as_numeric(table.column(i)))
+    return _arrow_to_pandas(table)
+
+
+def _as_numeric(column):
+    """Coluna de texto -> int64 ou float64 se todos os valores convertem; senão fica texto."""
+    for target in (pa.int64(), pa.float64()):
+        try:
+            return pc.cast(column, target)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+    return column
+
+
+def read_dataset(file, name: str | None = None) -> pd.DataFrame:
+    """
+    DataFrame de um arquivo de resultados (caminho ou arquivo aberto/enviado).
+    O formato sai da extensão de `name` (ou de file.name): .parquet,
+    .arrow/.feather (Arrow IPC) ou CSV. Caminhos são lidos por memory map.
+    """
+    is_path = isinstance(file, (str, os.PathLike))
+    name = (name or getattr(file, "name", None) or str(file)).lower()
+    if name.endswith(".csv"):
+        if not is_path:
+            return _read_csv(file, _csv_header(file))
+        with open(file, "rb") as f:
+            header = _csv_header(f)
+        return _read_csv(pa.memory_map(os.fspath(file)) if pa is not None else file, header)
+
+    if pa is None:
+        raise ImportError("Leitura de Parquet/Arrow requer pyarrow")
+    if name.endswith(".parquet"):
+        table = pq.read_table(file, memory_map=is_path)
+    elif name.endswith((".arrow", ".feather")):
+        table = feather.read_table(file, memory_map=is_path)
+    else:
+        raise ValueError(f"Formato não suportado: {name} (use {', '.join(DATASET_EXTENSIONS)})")
+    if "exame" in table.column_names:
+        raise ValueError("Arquivo no layout longo (uma linha por exame); o painel usa o layout largo (--layout wide).")
+    return _empty_to_null(_arrow_to_pandas(table))
+
+
+# ---------- catálogo do servidor ---------------------------------------
+class CatalogEntry(NamedTuple):
+    name: str
+    path: str
+    size: int
+    mtime_ns: int
+
+    @property
+    def key(self) -> str:
+        """Chave no registro: muda quando o arquivo é regravado."""
+        return f"{self.path}:{self.size}:{self.mtime_ns}"
+
+    def label(self) -> str:
+        modified = datetime.fromtimestamp(self.mtime_ns / 1e9).strftime("%d/%m/%Y %H:%M")
+        return f"{self.name} — {format_size(self.size)} — {modified}"
+
+
+def format_size(nbytes: int) -> str:
+    size = float(nbytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def list_datasets(results_dir: str) -> list[CatalogEntry]:
+    """Arquivos de resultados (DATASET_EXTENSIONS) em `results_dir`, do mais recente ao mais antigo."""
+    try:
+        scanned = list(os.scandir(results_dir))
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    entries = []
+    for item in scanned:
+        if item.name.startswith(".") or not item.name.lower().endswith(DATASET_EXTENSIONS):
+            continue
+        if not item.is_file():
+            continue
+        stat = item.stat()
+        entries.append(CatalogEntry(item.name, item.path, stat.st_size, stat.st_mtime_ns))
+    return sorted(entries, key=lambda entry: (-entry.mtime_ns, entry.name))
+
+
+# ---------- tipos compactos --------------------------------------------
+def _fits_float32(values: np.ndarray) -> bool:
+    """Todos os valores (NaN inclusive) voltam idênticos de float32 para float64."""
+    with np.errstate(over="ignore"):
+        narrowed = values.astype(np.float32)
+    return np.array_equal(narrowed.astype(np.float64), values, equal_nan=True)
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """_status/_ref -> category; valores de exame float64 -> float32 onde é exato."""
+    columns = set(df.columns)
+    dtypes = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if col.endswith((STATUS_SUFFIX, REF_SUFFIX)):
+            if dtype == object:
+                dtypes[col] = "category"
+        elif col + STATUS_SUFFIX in columns and dtype == np.float64 and _fits_float32(df[col].to_numpy()):
+            dtypes[col] = np.float32
+    return df.astype(dtypes, copy=False) if dtypes else df
+
+
+# ---------- registro compartilhado ------------------------------------
+class SharedDataset(NamedTuple):
+    df: pd.DataFrame
+    status_cols: tuple
+    mask: "AlterationMask"
+    nbytes: int
+
+    def session_view(self) -> pd.DataFrame:
+        """Vista rasa para uma sessão: não copia os dados."""
+        return self.df.copy(deep=False)
+
+
+def upload_key(data: bytes, name: str) -> str:
+    """Chave de um upload: sha256 do conteúdo + formato (extensão)."""
+    return f"{hashlib.sha256(data).hexdigest()}{os.path.splitext(name)[1].lower()}"
+
+
+def dataset_nbytes(df: pd.DataFrame, mask: "AlterationMask | None" = None) -> int:
+    """Memória ocupada pelo DataFrame (strings inclusive) e pela máscara."""
+    total = int(df.memory_usage(index=True, deep=True).sum())
+    return total + (mask.values.nbytes if mask is not None else 0)
+
+
+class DatasetRegistry:
+    """
+    Datasets prontos compartilhados entre sessões, por chave, com despejo LRU
+    dentro de `max_bytes`. `get(key, load)` chama load() -> (df, status_cols,
+    mask) só na primeira vez; sessões que pedem a mesma chave durante a
+    carga esperam por ela em vez de ler de novo.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: collections.OrderedDict[str, SharedDataset] = collections.OrderedDict()
+        self._loading: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str) -> SharedDataset | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key: str, load) -> SharedDataset:
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key)
+            if entry is not None:
+                return entry
+            try:
+                df, status_cols, mask = load()  # fora do lock geral: outras chaves seguem
+                mask.values.setflags(write=False)
+                entry = SharedDataset(df, tuple(status_cols), mask, dataset_nbytes(df, mask))
+                with self._lock:
+                    self._entries[key] = entry
+                    self._evict()
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return entry
+
+    def _evict(self) -> None:
+        total = sum(entry.nbytes for entry in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, oldest = self._entries.popitem(last=False)
+            total -= oldest.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "datasets": len(self._entries),
+                "nbytes": sum(entry.nbytes for entry in self._entries.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+# ---------- alterações -------------------------------------------------
+class AlterationMask:
+    """Matriz booleana status ∈ marcadores, com os rótulos de linha e de coluna do DataFrame."""
+
+    def __init__(self, df: pd.DataFrame, status_cols: list, markers=ALTERATION_MARKERS):
+        self.columns = list(status_cols)
+        self.markers = list(markers)
+        self.index = df.index
+        if self.columns:
+            self.values = df[self.columns].isin(markers).to_numpy()
+        else:
+            self.values = np.zeros((len(df), 0), dtype=bool)
+        self._col_pos = {col: i for i, col in enumerate(self.columns)}
+
+    def patient_flags(self) -> np.ndarray:
+        """Paciente com ao menos um exame alterado."""
+        return self.values.any(axis=1)
+
+    def patient_counts(self) -> np.ndarray:
+        """Quantidade de exames alterados por paciente."""
+        return self.values.sum(axis=1)
+
+    def covers(self, status_cols, markers=ALTERATION_MARKERS) -> bool:
+        return list(markers) == self.markers and all(col in self._col_pos for col in status_cols)
+
+    def column_counts(self, status_cols, index=None) -> np.ndarray:
+        """
+        Alterações por coluna de `status_cols`, nas linhas de `index` (rótulos
+        de um recorte do DataFrame original; None = todas).
+        """
+        cols = [self._col_pos[col] for col in status_cols]
+        if index is None:
+            return self.values[:, cols].sum(axis=0)
+        rows = self.index.get_indexer(index)
+        if (rows < 0).any():
+            raise KeyError("Recorte com linhas que não estão no DataFrame da máscara")
+        return self.values[np.ix_(rows, cols)].sum(axis=0)
+
+
+def add_alteration_columns(df: pd.DataFrame, status_cols: list, markers=ALTERATION_MARKERS) -> AlterationMask:
+    """Acrescenta paciente_com_alteracao / qtde_exames_alterados e devolve a máscara usada."""
+    mask = AlterationMask(df, status_cols, markers)
+    df["paciente_com_alteracao"] = mask.patient_flags()
+    df["qtde_exames_alterados"] = mask.patient_counts()
+    return mask
+
+
+def exam_display_name(status_col: str) -> str:
+    return status_col.replace("_status", "").replace("_", " ").title()
+
+
+def top_altered_exams(dataframe: pd.DataFrame, status_cols: list, markers=ALTERATION_MARKERS,
+                      mask: AlterationMask | None = None) -> pd.DataFrame:
+    """
+    Exames com alteração no recorte `dataframe`, do mais para o menos alterado.
+    Com a máscara do carregamento (recorte do mesmo DataFrame), as contagens
+    saem dela; sem ela, status_cols são reavaliadas com isin.
+    """
+    if dataframe.empty or not status_cols:
+        return pd.DataFrame(columns=["Exame", "Número de Alterações"])
+    status_cols = [col for col in status_cols if col in dataframe.columns]  # Ensure column exists
+    if mask is not None and mask.covers(status_cols, markers):
+        counts = mask.column_counts(status_cols, dataframe.index)
+    else:
+        counts = dataframe[status_cols].isin(markers).sum().to_numpy()
+
+    alteracoes = collections.Counter()
+    for col, count in zip(status_cols, counts):
+        alteracoes[exam_display_name(col)] += int(count)
+    if alteracoes:
+        df_top_altered = pd.DataFrame.from_dict(alteracoes, orient="index", columns=["Número de Alterações"])
+        df_top_altered = df_top_altered.sort_values(by="Número de Alterações", ascending=False).reset_index().rename(columns={"index": "Exame"})
+        return df_top_altered[df_top_altered["Número de Alterações"] > 0] # Filter out exams with 0 alterations
+    return pd.DataFrame(columns=["Exame", "Número de Alterações"])
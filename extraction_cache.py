@@ -0,0 +1,148 @@
+import os
+import json
+import sqlite3
+import hashlib
+
+from test_patterns2 import TEST_PATTERNS
+from ref_index import REF_TABLE_HASH
+
+# Cache persistente da extração, em SQLite.
+#   • texts:   (hash do arquivo, variante do extrator de texto) -> texto do PDF
+#   • results: (hash do arquivo, versão das regras)            -> dict do paciente
+#     (de um PDF, "versão/variante": o resultado depende do texto extraído)
+# A versão das regras é um hash de TEST_PATTERNS + hash da tabela de
+# referências (ref_table) + versão do parser, então qualquer mudança de
+# padrão ou referência invalida os resultados sozinha (o texto extraído
+# continua valendo e só a regex roda).
+# Cada processo do pool abre a sua própria conexão; o modo WAL deixa vários
+# processos lerem/gravarem o mesmo arquivo. Uma conexão nunca atravessa um
+# fork (regra do SQLite): o filho esquece as conexões herdadas do pai, sem
+# usá-las nem fechá-las, e abre as suas.
+# A cada execução, prune_stale_results apaga os resultados de versões de
+# regras antigas; sem isso cada mudança de padrão/referência deixaria um
+# conjunto inteiro de resultados mortos no arquivo.
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "extraction_cache.sqlite")
+
+_HASH_CHUNK = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    """sha256 do conteúdo do arquivo (nome e data de modificação não importam)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_digest(data: bytes) -> str:
+    """file_digest para um conteúdo já em memória (membro de ZIP/tar, corpus empacotado)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def rules_version(parser_version: str) -> str:
+    """Hash das regras que determinam o resultado de um laudo."""
+    h = hashlib.sha256()
+    h.update(parser_version.encode("utf-8"))
+    h.update(repr(TEST_PATTERNS).encode("utf-8"))
+    h.update(REF_TABLE_HASH.encode("ascii"))
+    return h.hexdigest()[:16]
+
+
+class ExtractionCache:
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS texts (
+                digest  TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                text    TEXT NOT NULL,
+                PRIMARY KEY (digest, variant)
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                digest  TEXT NOT NULL,
+                rules   TEXT NOT NULL,
+                result  TEXT NOT NULL,
+                PRIMARY KEY (digest, rules)
+            );
+        """)
+
+    def get_text(self, digest: str, variant: str) -> str | None:
+        row = self._conn.execute(
+            "SELECT text FROM texts WHERE digest = ? AND variant = ?", (digest, variant)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put_text(self, digest: str, variant: str, text: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO texts (digest, variant, text) VALUES (?, ?, ?)",
+                (digest, variant, text),
+            )
+
+    def get_result(self, digest: str, rules: str) -> tuple[bool, dict | None]:
+        """(hit, resultado). Um laudo sem dados de paciente fica cacheado como None."""
+        row = self._conn.execute(
+            "SELECT result FROM results WHERE digest = ? AND rules = ?", (digest, rules)
+        ).fetchone()
+        if not row:
+            return False, None
+        return True, json.loads(row[0])
+
+    def put_result(self, digest: str, rules: str, result: dict | None) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (digest, rules, result) VALUES (?, ?, ?)",
+                (digest, rules, json.dumps(result, ensure_ascii=False)),
+            )
+
+    def prune_results(self, keep_rules: str) -> int:
+        """Apaga resultados de versões de regras antigas (todas as variantes). Retorna quantos saíram."""
+        with self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM results WHERE rules != ? AND substr(rules, 1, ?) != ?",
+                (keep_rules, len(keep_rules) + 1, keep_rules + "/"),
+            )
+        return cur.rowcount
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_open_caches = {}
+_inherited_caches = []  # conexões do pai, mantidas vivas só para não serem fechadas no filho
+
+
+def _forget_inherited_caches() -> None:
+    _inherited_caches.extend(_open_caches.values())
+    _open_caches.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_inherited_caches)
+
+
+def get_cache(db_path: str) -> ExtractionCache:
+    """Uma conexão por processo e por arquivo (reaproveitada entre laudos)."""
+    cache = _open_caches.get(db_path)
+    if cache is None:
+        cache = _open_caches[db_path] = ExtractionCache(db_path)
+    return cache
+
+
+def prune_stale_results(db_path: str, keep_rules: str) -> int:
+    """
+    prune_results numa conexão própria, fechada logo em seguida (chamada no
+    processo principal antes de abrir o pool). Retorna quantos resultados saíram.
+    """
+    cache = ExtractionCache(db_path)
+    try:
+        return cache.prune_results(keep_rules)
+    finally:
+        cache.close()
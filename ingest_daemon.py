@@ -0,0 +1,480 @@
+import os
+import json
+import time
+import signal
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # sem watchdog: varredura periódica da pasta
+    FileSystemEventHandler = object
+    Observer = None
+
+from unimed import PAGE_MODES, TEXT_BACKENDS, _process_file_safe, prune_cache
+from extraction_cache import DEFAULT_CACHE_PATH
+from result_writers import (
+    SPILL_SUFFIX, default_output_path, iter_spill, reconcile_spill, scan_spill, spill_to_parquet, text_value_fields,
+)
+
+# Ingestão contínua: vigia uma pasta de entrada e extrai cada laudo novo assim
+# que ele termina de chegar, em vez do lote noturno.
+#   • eventos do sistema de arquivos via watchdog (inotify no Linux, FSEvents
+#     no macOS); sem watchdog, varredura periódica da pasta;
+#   • um arquivo só entra quando tamanho/mtime ficam estáveis por `settle`
+#     segundos (cópia ainda em andamento não é lida pela metade);
+#   • pool de processos limitado e no máximo `max_in_flight` laudos em
+#     processamento: o resto espera na fila (só os nomes ficam em memória);
+#   • cada resultado é anexado (com fsync) ao diário JSON Lines da saída e só
+#     então o arquivo ganha seu marcador em <entrada>/.processed/, gravado de
+#     forma atômica (tmp + rename). O marcador guarda o tamanho do diário
+#     naquele ponto: ao reiniciar, o diário é cortado no maior tamanho
+#     registrado, então um laudo nunca entra duas vezes nem se perde;
+#   • laudo que falha (PDF travado, cópia truncada) não ganha marcador: volta
+#     para a fila e é tentado até `max_attempts` vezes; depois disso fica de
+#     fora até mudar na pasta. As tentativas ficam em
+#     <entrada>/.processed/falhas/<arquivo>.json, então valem entre reinícios;
+#   • se um processo do pool morre (segfault do PyMuPDF num PDF ruim), o pool
+#     é recriado; os laudos que estavam nele voltam para a fila e rodam um de
+#     cada vez, e só o que derruba o pool sozinho conta a tentativa;
+#   • o CSV/Parquet final é regenerado a partir do diário no máximo a cada
+#     `publish_interval` segundos, e só se entraram linhas novas desde a
+#     última publicação (com tmp + rename, como no lote).
+
+MARKER_DIR = ".processed"
+FAILURE_DIR = "falhas"
+JOURNAL_SUFFIX = ".journal.jsonl"
+INPUT_EXTENSIONS = (".pdf", ".txt")
+PARTIAL_SUFFIXES = (".part", ".tmp", ".crdownload", ".download", SPILL_SUFFIX)
+MAX_ATTEMPTS = 3
+
+
+def _is_candidate(fname: str) -> bool:
+    """Laudo a processar (ignora ocultos e arquivos ainda sendo baixados/copiados)."""
+    lower = fname.lower()
+    return not fname.startswith(".") and lower.endswith(INPUT_EXTENSIONS) and not lower.endswith(PARTIAL_SUFFIXES)
+
+
+def _write_atomic(path: str, data: str) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ---------- marcadores -------------------------------------------------
+class ProcessedMarkers:
+    """
+    Um marcador JSON por laudo já processado, em <entrada>/.processed/<arquivo>.json,
+    e um registro de tentativas por laudo que falhou, em .processed/falhas/.
+    """
+
+    def __init__(self, inbox: str):
+        self.directory = os.path.join(inbox, MARKER_DIR)
+        self.failure_directory = os.path.join(self.directory, FAILURE_DIR)
+        os.makedirs(self.failure_directory, exist_ok=True)
+        self.done = set()
+        self.failures = {}  # nome -> (tentativas, tamanho/mtime do arquivo na última falha)
+        self.committed_offset = 0
+        for marker in os.listdir(self.directory):
+            if not marker.endswith(".json"):
+                continue  # .tmp de um marcador que não chegou a ser renomeado
+            with open(os.path.join(self.directory, marker), encoding="utf-8") as f:
+                info = json.load(f)
+            self.committed_offset = max(self.committed_offset, info.get("offset_diario", 0))
+            if info.get("status") == "erro":
+                continue  # marcador de falha de versões antigas: tenta de novo
+            self.done.add(info["arquivo"])
+        for record in os.listdir(self.failure_directory):
+            if not record.endswith(".json"):
+                continue
+            with open(os.path.join(self.failure_directory, record), encoding="utf-8") as f:
+                info = json.load(f)
+            signature = tuple(info["assinatura"]) if info.get("assinatura") else None
+            self.failures[info["arquivo"]] = (info["tentativas"], signature)
+
+    def mark(self, fname: str, info: dict) -> None:
+        _write_atomic(
+            os.path.join(self.directory, fname + ".json"),
+            json.dumps({"arquivo": fname, **info}, ensure_ascii=False),
+        )
+        self.done.add(fname)
+        self.clear_failure(fname)
+
+    def record_failure(self, fname: str, attempts: int, signature, erro: str) -> None:
+        _write_atomic(
+            os.path.join(self.failure_directory, fname + ".json"),
+            json.dumps({
+                "arquivo": fname,
+                "tentativas": attempts,
+                "assinatura": list(signature) if signature else None,
+                "erro": erro,
+                "falhou_em": datetime.now().isoformat(timespec="seconds"),
+            }, ensure_ascii=False),
+        )
+        self.failures[fname] = (attempts, signature)
+
+    def clear_failure(self, fname: str) -> None:
+        if self.failures.pop(fname, None) is not None:
+            try:
+                os.remove(os.path.join(self.failure_directory, fname + ".json"))
+            except FileNotFoundError:
+                pass
+
+
+# ---------- saída ------------------------------------------------------
+class IngestStore:
+    """
+    Diário JSON Lines (mesmo formato do spill de result_writers) + arquivo
+    final regenerado a partir dele. Só a lista de colunas fica em memória.
+    """
+
+    def __init__(self, output_path: str, fmt: str = "csv", layout: str = "wide", committed_offset: int = 0):
+        self.output_path = output_path
+        self.fmt = fmt
+        self.layout = layout
+        self.journal_path = output_path + JOURNAL_SUFFIX
+        self.n_rows = 0
+        self.published_rows = 0
+        self.all_fields, self.text_fields = set(), set()
+
+        # Linhas depois do último marcador são de laudos que serão reprocessados
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > committed_offset:
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(committed_offset)
+        if os.path.exists(self.journal_path):
+            self.all_fields, self.text_fields = scan_spill(self.journal_path)
+            self.n_rows = sum(1 for _ in iter_spill(self.journal_path))
+            if os.path.exists(output_path):
+                self.published_rows = self.n_rows  # saída já publicada no encerramento anterior
+        self._journal = open(self.journal_path, "ab")
+
+    def append(self, row: dict) -> int:
+        """Anexa um resultado, com fsync. Retorna o tamanho do diário depois da escrita."""
+        self._journal.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self.all_fields.update(row.keys())
+        self.text_fields.update(text_value_fields(row))
+        self.n_rows += 1
+        return self._journal.tell()
+
+    def offset(self) -> int:
+        return self._journal.tell()
+
+    @property
+    def dirty(self) -> bool:
+        """Há linhas no diário que ainda não estão na saída publicada."""
+        return self.n_rows > self.published_rows
+
+    def publish(self) -> None:
+        """Regenera o CSV/Parquet final a partir do diário (nada a fazer se não há linhas novas)."""
+        if not self.dirty:
+            return
+        n_rows = self.n_rows
+        if self.fmt == "parquet":
+            spill_to_parquet(self.journal_path, self.output_path, self.layout, self.all_fields, self.text_fields)
+        else:
+            reconcile_spill(self.journal_path, self.output_path, self.all_fields)
+        self.published_rows = n_rows
+
+    def close(self) -> None:
+        self._journal.close()
+
+
+# ---------- vigia ------------------------------------------------------
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, notify):
+        self.notify = notify
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path:
+                self.notify(os.path.basename(path))
+
+
+class InboxWatcher:
+    """
+    Acumula nomes de arquivos que mudaram na pasta. Com watchdog recebe os
+    eventos do sistema; sem ele (ou como rede de segurança a cada
+    `rescan_interval`), lista a pasta inteira.
+    """
+
+    def __init__(self, inbox: str, poll_interval: float = 2.0, rescan_interval: float = 60.0, use_events: bool = True):
+        self.inbox = inbox
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._changed = set()
+        self._wakeup = threading.Event()
+        self._last_scan = None
+        self._observer = None
+        if use_events and Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self._notify), inbox, recursive=False)
+            self._observer.start()
+
+    @property
+    def mode(self) -> str:
+        return "eventos" if self._observer else "varredura"
+
+    def _notify(self, fname: str) -> None:
+        with self._lock:
+            self._changed.add(fname)
+        self._wakeup.set()
+
+    def poll(self, timeout: float) -> set:
+        """Nomes alterados desde a última chamada (espera até `timeout` por novidades)."""
+        now = time.monotonic()
+        interval = self.rescan_interval if self._observer else self.poll_interval
+        if self._last_scan is None or now - self._last_scan >= interval:
+            self._last_scan = now
+            with self._lock:
+                self._changed.update(os.listdir(self.inbox))
+        else:
+            self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        return {fname for fname in changed if _is_candidate(fname)}
+
+    def stop(self) -> None:
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+
+
+# ---------- laço principal ---------------------------------------------
+def _file_signature(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _commit(fname: str, resultado, erro, store: IngestStore, markers: ProcessedMarkers) -> bool:
+    """
+    Diário primeiro, marcador depois: o marcador é o ponto de confirmação.
+    Falhas não são marcadas (o laudo pode ser tentado de novo); retorna False nesse caso.
+    """
+    if erro:
+        return False
+    if resultado:
+        store.append(resultado)
+        print(f"📄 Processado: {fname}")
+        status = "ok"
+    else:
+        status = "sem_paciente"
+    markers.mark(fname, {
+        "status": status,
+        "offset_diario": store.offset(),
+        "processado_em": datetime.now().isoformat(timespec="seconds"),
+    })
+    return True
+
+
+def _ignore_sigint() -> None:
+    # Ctrl+C é tratado só no processo principal, que termina o que está no pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, initializer=_ignore_sigint)
+
+
+def run_ingest(inbox: str, output_path: str | None = None, fmt: str = "csv", layout: str = "wide",
+               workers: int = 1, max_in_flight: int | None = None, settle: float = 2.0,
+               poll_interval: float = 2.0, publish_interval: float = 10.0, cache_path: str | None = None,
+               pages: str = "all", backend: str = "words", once: bool = False, use_events: bool = True,
+               max_attempts: int = MAX_ATTEMPTS, stop_event: threading.Event | None = None) -> int:
+    """
+    Vigia `inbox` e processa os laudos novos até `stop_event` (ou SIGINT/SIGTERM).
+    once=True processa o que já está na pasta e termina.
+    Um laudo que falha volta para a fila (esperando `settle` de novo) até
+    `max_attempts` tentativas, contadas também entre reinícios; depois só é
+    retomado se o arquivo mudar.
+    Retorna quantos laudos foram processados nesta execução.
+    """
+    output_path = output_path or default_output_path(fmt, layout)
+    max_in_flight = max_in_flight or workers * 2
+    stop_event = stop_event or threading.Event()
+
+    if cache_path:
+        prune_cache(cache_path)
+    markers = ProcessedMarkers(inbox)
+    store = IngestStore(output_path, fmt, layout, markers.committed_offset)
+    watcher = InboxWatcher(inbox, poll_interval, use_events=use_events and not once)
+    print(f"👀 Vigiando {inbox} ({watcher.mode}), {len(markers.done)} laudo(s) já processado(s)")
+
+    pending = {}      # nome -> (tamanho/mtime, instante em que foram vistos)
+    in_flight = {}    # future -> nome
+    suspects = set()  # estavam no pool quando ele caiu: rodam sozinhos
+    processed = 0
+    pool_broken = False
+    last_publish = time.monotonic()
+
+    def failed(fname: str, erro: str) -> None:
+        signature = _file_signature(os.path.join(inbox, fname))
+        attempts, previous = markers.failures.get(fname, (0, None))
+        attempts = attempts + 1 if previous == signature else 1  # arquivo mudou: recomeça a contagem
+        markers.record_failure(fname, attempts, signature, erro)
+        if attempts < max_attempts and not stop_event.is_set():
+            print(f"⚠️ Falha em {fname} (tentativa {attempts}/{max_attempts}): {erro}")
+            pending[fname] = (signature, time.monotonic())
+        else:
+            print(f"❌ Falha em {fname} após {attempts} tentativa(s): {erro}")
+            suspects.discard(fname)
+
+    def collect(futures) -> None:
+        nonlocal processed, pool_broken
+        futures = list(futures)
+        if any(isinstance(f.exception(), BrokenProcessPool) for f in futures):
+            # Pool quebrado: todos os futures pendentes terminam (com erro) logo
+            rest = [f for f in in_flight if f not in futures]
+            wait(rest)
+            futures += rest
+        crashed = []
+        for future in futures:
+            fname = in_flight.pop(future)
+            try:
+                _, resultado, erro = future.result()
+            except BrokenProcessPool:
+                crashed.append(fname)
+                continue
+            except Exception as e:
+                resultado, erro = None, f"{type(e).__name__}: {e}"
+            if _commit(fname, resultado, erro, store, markers):
+                suspects.discard(fname)
+                processed += 1
+            else:
+                failed(fname, erro)
+        if not crashed:
+            return
+        pool_broken = True
+        if len(crashed) == 1:
+            failed(crashed[0], "processo do pool morreu durante a extração (BrokenProcessPool)")
+            return
+        # Não dá para saber qual derrubou o pool: cada um roda sozinho, sem contar tentativa
+        print(f"⚠️ Pool de processos caiu com {len(crashed)} laudo(s) em andamento; serão refeitos um a um")
+        for fname in crashed:
+            suspects.add(fname)
+            pending[fname] = (_file_signature(os.path.join(inbox, fname)), time.monotonic())
+
+    executor = _new_pool(workers)
+    try:
+        while not stop_event.is_set():
+            timeout = 0 if in_flight else (min(settle, poll_interval) if pending else poll_interval)
+            now = time.monotonic()
+            for fname in watcher.poll(timeout):
+                if fname in markers.done or fname in pending or fname in in_flight.values():
+                    continue
+                signature = _file_signature(os.path.join(inbox, fname))
+                failure = markers.failures.get(fname)
+                if failure and failure[1] != signature:
+                    markers.clear_failure(fname)  # arquivo novo/corrigido: tentativas zeradas
+                elif failure and failure[0] >= max_attempts:
+                    continue  # esgotou as tentativas e não mudou desde então
+                pending[fname] = (signature, now)
+
+            # Arquivos estáveis há `settle` segundos vão para o pool, até o limite;
+            # suspeitos de derrubar o pool primeiro, e sozinhos
+            now = time.monotonic()
+            isolating = any(fname in suspects for fname in in_flight.values())
+            for fname in sorted(pending, key=lambda f: (f not in suspects, f)):
+                if isolating or len(in_flight) >= max_in_flight:
+                    break  # backpressure: o resto espera na fila
+                path = os.path.join(inbox, fname)
+                signature = _file_signature(path)
+                previous, seen_at = pending[fname]
+                if signature is None:
+                    del pending[fname]  # apagado/movido antes de ser lido
+                elif signature != previous:
+                    pending[fname] = (signature, now)  # ainda sendo copiado
+                elif once or now - seen_at >= settle:
+                    if fname in suspects:
+                        if in_flight:
+                            break  # espera o pool esvaziar para rodá-lo sozinho
+                        isolating = True
+                    try:
+                        future = executor.submit(_process_file_safe, path, cache_path, pages, backend)
+                    except BrokenProcessPool:
+                        pool_broken = True  # o que estava no pool é recolhido abaixo
+                        break
+                    del pending[fname]
+                    in_flight[future] = fname
+
+            if in_flight:
+                done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                collect(done)
+
+            if pool_broken and not in_flight:
+                executor.shutdown(wait=False)
+                executor = _new_pool(workers)
+                pool_broken = False
+
+            if store.dirty and time.monotonic() - last_publish >= publish_interval:
+                store.publish()
+                last_publish = time.monotonic()
+                print(f"✅ {store.output_path} atualizado ({store.n_rows} linha(s))")
+
+            if once and not pending and not in_flight:
+                break
+    finally:
+        # Interrompido: o que já estava no pool termina e é registrado
+        collect(list(in_flight))
+        executor.shutdown()
+        store.publish()
+        store.close()
+        watcher.stop()
+    return processed
+
+
+# ---------- main -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Vigia uma pasta e extrai cada laudo novo assim que ele chega.")
+    parser.add_argument("entrada", help="Pasta de entrada (inbox) dos laudos PDF/TXT.")
+    parser.add_argument("-o", "--output", default=None, help="Arquivo de saída (padrão: all_lab_results.<formato>).")
+    parser.add_argument("-f", "--format", choices=["csv", "parquet"], default="csv", dest="fmt")
+    parser.add_argument("--layout", choices=["wide", "long"], default="wide")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Processos em paralelo (0 = todos os núcleos).")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Laudos em processamento ao mesmo tempo (padrão: 2 × workers).")
+    parser.add_argument("--settle", type=float, default=2.0, help="Segundos sem mudança antes de ler um arquivo.")
+    parser.add_argument("--poll", type=float, default=2.0, help="Intervalo da varredura sem watchdog (segundos).")
+    parser.add_argument("--publish-interval", type=float, default=10.0, help="Intervalo mínimo entre atualizações da saída.")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="Tentativas por laudo que falha.")
+    parser.add_argument("--no-events", action="store_true", help="Não usa watchdog, só varredura periódica.")
+    parser.add_argument("--once", action="store_true", help="Processa o que já está na pasta e sai.")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, default=None, metavar="ARQUIVO")
+    parser.add_argument("--pages", choices=PAGE_MODES, default="all")
+    parser.add_argument("--backend", choices=list(TEXT_BACKENDS), default="words")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.entrada):
+        print(f"❌ Diretório '{args.entrada}' inválido ou não encontrado!")
+        return
+
+    stop_event = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop_event.set())
+
+    processed = run_ingest(
+        args.entrada, args.output, args.fmt, args.layout,
+        workers=args.workers or os.cpu_count() or 1, max_in_flight=args.max_in_flight,
+        settle=args.settle, poll_interval=args.poll, publish_interval=args.publish_interval,
+        cache_path=args.cache, pages=args.pages, backend=args.backend,
+        once=args.once, use_events=not args.no_events, max_attempts=args.max_attempts, stop_event=stop_event,
+    )
+    print(f"🛑 Encerrado: {processed} laudo(s) processado(s) nesta execução.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import os
+import sys
+import mmap
+import struct
+import argparse
+from array import array
+
+# Corpus "empacotado" de laudos TXT: um arquivo de dados com todos os textos
+# (UTF-8, um após o outro) + um índice binário com offsets, lidos via mmap.
+# Iterar milhões de laudos vira fatiar memória já mapeada, sem listar pasta
+# nem abrir/fechar um arquivo por laudo.
+#
+#   <nome>.pack       textos concatenados
+#   <nome>.pack.idx   cabeçalho | (offset, tamanho) × n | offsets dos nomes × (n+1) | nomes
+#
+# Cabeçalho: MAGIC (8 bytes), versão (u32), n (u64). Os arrays são uint64
+# little-endian e são lidos direto do mmap (memoryview.cast, ordem nativa),
+# sem cópia — por isso só máquinas little-endian (x86/ARM) são suportadas.
+
+MAGIC = b"LAUDOPK1"
+VERSION = 1
+INDEX_SUFFIX = ".idx"
+_HEADER = struct.Struct("<8sIQ")
+
+if sys.byteorder != "little" or array("Q").itemsize != 8:
+    raise ImportError("packed_corpus requer uma plataforma little-endian com uint64 nativo")
+
+
+def index_path(pack_path: str) -> str:
+    return pack_path + INDEX_SUFFIX
+
+
+def is_packed_corpus(path: str) -> bool:
+    return os.path.isfile(path) and os.path.isfile(index_path(path))
+
+
+# ---------- escrita ----------------------------------------------------
+class PackedCorpusWriter:
+    """
+    Acrescenta laudos a um corpus novo. O índice só é gravado no close()
+    (tmp + rename), então um .pack sem .idx é um empacotamento incompleto.
+    """
+
+    def __init__(self, pack_path: str):
+        self.pack_path = pack_path
+        self._data = open(pack_path, "wb")
+        self._spans = []       # offset, tamanho, offset, tamanho, ...
+        self._names = bytearray()
+        self._name_offsets = [0]
+
+    def add(self, name: str, text: str | bytes) -> None:
+        data = text.encode("utf-8") if isinstance(text, str) else text
+        self._spans += (self._data.tell(), len(data))
+        self._data.write(data)
+        self._names += name.encode("utf-8")
+        self._name_offsets.append(len(self._names))
+
+    def __len__(self) -> int:
+        return len(self._spans) // 2
+
+    def close(self) -> None:
+        self._data.close()
+        tmp_path = index_path(self.pack_path) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(self)))
+            f.write(array("Q", self._spans).tobytes())
+            f.write(array("Q", self._name_offsets).tobytes())
+            f.write(self._names)
+        os.replace(tmp_path, index_path(self.pack_path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._data.close()
+        return False
+
+
+def pack_directory(directory_path: str, pack_path: str, extensions=(".txt",)) -> int:
+    """Empacota os TXT de uma pasta (em ordem alfabética). Retorna quantos entraram."""
+    with PackedCorpusWriter(pack_path) as writer:
+        with os.scandir(directory_path) as entries:
+            names = sorted(e.name for e in entries if e.is_file() and e.name.lower().endswith(extensions))
+        for name in names:
+            with open(os.path.join(directory_path, name), "rb") as f:
+                writer.add(name, f.read())
+    return len(names)
+
+
+# ---------- leitura ----------------------------------------------------
+def _mmap_file(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None  # mmap não aceita arquivo vazio
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class PackedCorpus:
+    """
+    Leitor de um corpus empacotado. Documentos acessados por posição:
+    view(i) devolve um memoryview sobre o mmap (cópia zero); text(i) decodifica.
+    """
+
+    def __init__(self, pack_path: str):
+        self.pack_path = pack_path
+        self._index_map = _mmap_file(index_path(pack_path))
+        if self._index_map is None:
+            raise ValueError(f"Índice vazio: {index_path(pack_path)}")
+        magic, version, count = _HEADER.unpack_from(self._index_map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{index_path(pack_path)} não é um índice de corpus empacotado (v{VERSION})")
+        self._count = count
+
+        self._index = memoryview(self._index_map)
+        start = _HEADER.size
+        self._spans = self._index[start:start + 16 * count].cast("Q")
+        start += 16 * count
+        self._name_offsets = self._index[start:start + 8 * (count + 1)].cast("Q")
+        start += 8 * (count + 1)
+        self._names = self._index[start:]
+
+        self._data_map = _mmap_file(pack_path)
+        self._data = memoryview(self._data_map) if self._data_map is not None else memoryview(b"")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def name(self, i: int) -> str:
+        return bytes(self._names[self._name_offsets[i]:self._name_offsets[i + 1]]).decode("utf-8")
+
+    def view(self, i: int) -> memoryview:
+        offset, length = self._spans[2 * i], self._spans[2 * i + 1]
+        return self._data[offset:offset + length]
+
+    def text(self, i: int) -> str:
+        return str(self.view(i), "utf-8")
+
+    def __iter__(self):
+        """(nome, texto) de cada laudo, na ordem do empacotamento."""
+        for i in range(self._count):
+            yield self.name(i), self.text(i)
+
+    def close(self) -> None:
+        # memoryviews precisam ser soltos antes de fechar os mmaps
+        for view in (self._spans, self._name_offsets, self._names, self._index, self._data):
+            view.release()
+        if self._data_map is not None:
+            self._data_map.close()
+        self._index_map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+_open_corpora = {}
+if hasattr(os, "register_at_fork"):
+    # Como em corpus_reader._open_zips: cada processo do pool abre o seu corpus
+    os.register_at_fork(after_in_child=_open_corpora.clear)
+
+
+def get_corpus(pack_path: str) -> PackedCorpus:
+    """Um mmap por processo e por corpus (reaproveitado entre laudos, como get_cache)."""
+    corpus = _open_corpora.get(pack_path)
+    if corpus is None:
+        corpus = _open_corpora[pack_path] = PackedCorpus(pack_path)
+    return corpus
+
+
+# ---------- main -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Corpus empacotado de laudos TXT (um arquivo + índice, lido via mmap).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_pack = sub.add_parser("pack", help="Empacota os TXT de uma pasta.")
+    p_pack.add_argument("pasta")
+    p_pack.add_argument("saida", help="Arquivo .pack de saída (o índice vai em <saida>.idx).")
+    p_ls = sub.add_parser("ls", help="Lista os laudos de um corpus.")
+    p_ls.add_argument("corpus")
+    p_cat = sub.add_parser("cat", help="Mostra o texto de um laudo.")
+    p_cat.add_argument("corpus")
+    p_cat.add_argument("nome")
+    args = parser.parse_args()
+
+    if args.cmd == "pack":
+        n = pack_directory(args.pasta, args.saida)
+        print(f"✅ {n} laudo(s) empacotado(s) em {args.saida}")
+        return
+    with PackedCorpus(args.corpus) as corpus:
+        if args.cmd == "ls":
+            for i in range(len(corpus)):
+                print(f"{len(corpus.view(i)):>8}  {corpus.name(i)}")
+        else:
+            for i in range(len(corpus)):
+                if corpus.name(i) == args.nome:
+                    print(corpus.text(i))
+                    return
+            print(f"❌ Laudo '{args.nome}' não está no corpus.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+import re
+import time
+from bisect import bisect_right
+from typing import NamedTuple
+
+from test_patterns2 import TEST_PATTERNS
+
+# Motor de padrões compilados: cada regex de TEST_PATTERNS é compilada uma única
+# vez na importação e ganha uma lista de "âncoras" (o prefixo literal da regex,
+# ex.: "GLICOSE", "HEMACIAS"). Uma varredura do laudo (normalizado uma única
+# vez) localiza a primeira ocorrência de todas as âncoras; cada exame é então
+# buscado somente a partir do ponto onde sua seção começa, e exames cuja
+# âncora não aparece no laudo nem chegam a rodar a regex.
+#
+# O laudo também é segmentado uma vez em seções de exame (cada bloco começa
+# num título seguido de "Método:"), e cada regex só varre a seção onde a sua
+# âncora aparece: um ".*?RESULTADO" não atravessa mais para o bloco do exame
+# seguinte, e padrões homônimos (HEMOGLOBINA do hemograma x da urina) não
+# disputam o texto inteiro. Laudo sem nenhum "Método:" = uma seção só.
+
+PATTERN_FLAGS = re.IGNORECASE | re.DOTALL
+MIN_ANCHOR_LEN = 2  # âncoras de 1 caractere não filtram nada
+PAGE_KEY_MIN_LETTERS = 3  # chaves de página mais curtas ("PH") casariam em qualquer texto
+
+_META = set(".^$*+?{}[]|()")
+_QUANTIFIERS = set("*+?{")
+
+
+# ---------- âncoras ----------------------------------------------------
+def _literal_prefix(pattern: str) -> tuple[str, int]:
+    """
+    Lê o prefixo puramente literal de uma regex.
+    Retorna (literal, posição onde o literal termina).
+    "TSH - TIREOESTIMULANTE\\s*Método" -> "TSH - TIREOESTIMULANTE"
+    "PROTROMBINA \\(PADRÃO\\)\\.{4}:"    -> "PROTROMBINA (PADRÃO)"
+    """
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            nxt = pattern[i + 1:i + 2]
+            if not nxt or nxt.isalnum():  # \s, \d, \b ... não são literais
+                break
+            lit, step = nxt, 2
+        elif c in _META:
+            break
+        else:
+            lit, step = c, 1
+        # caractere quantificado ("\.{4}", "S?") não faz parte do prefixo fixo
+        following = pattern[i + step:i + step + 1]
+        if following and following in _QUANTIFIERS:
+            break
+        out.append(lit)
+        i += step
+    return "".join(out), i
+
+
+def pattern_anchors(pattern: str) -> list[str]:
+    """
+    Âncoras literais que obrigatoriamente iniciam qualquer match da regex.
+    Suporta prefixo literal simples e um grupo inicial de alternativas
+    literais, ex.: "(?:LEUCOCITOS|LEUCÓCITOS)\\s+..." -> ["LEUCOCITOS", "LEUCÓCITOS"].
+    Lista vazia = regex sem âncora (sempre executada no texto inteiro).
+    """
+    if pattern.startswith("(?:"):
+        end = pattern.find(")")
+        if end == -1:
+            return []
+        alternatives = pattern[3:end].split("|")
+        anchors = []
+        for alt in alternatives:
+            literal, consumed = _literal_prefix(alt)
+            if consumed != len(alt) or len(literal) < MIN_ANCHOR_LEN:
+                return []
+            anchors.append(literal)
+        return anchors
+
+    literal, _ = _literal_prefix(pattern)
+    if len(literal) < MIN_ANCHOR_LEN:
+        return []
+    return [literal]
+
+
+def pattern_head(pattern: str) -> str:
+    """
+    Começo da regex até o primeiro grupo de captura ou ".*": o nome completo
+    do exame como a regex o escreve, com classes e espaços flexíveis.
+    "HEM[ÁA]CIAS\\s*([\\d,\\.]+)..." -> "HEM[ÁA]CIAS\\s*"
+    "UREIA\\s*Método\\s*:.*?RESULTADO..." -> "UREIA\\s*Método\\s*:"
+    """
+    i, depth = 0, 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            i = pattern.index("]", i + 2 if pattern[i + 1:i + 2] == "]" else i + 1) + 1
+            continue
+        if c == "(":
+            if not pattern.startswith("(?", i):
+                break
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif depth == 0 and pattern.startswith(".*", i):
+            break
+        i += 1
+    return pattern[:i]
+
+
+def _head_letters(head: str) -> int:
+    """Letras do nome na cabeça da regex (\\s, \\d... não contam; uma classe [..] conta uma)."""
+    return sum(c.isalpha() for c in re.sub(r"\\[A-Za-z]|\[[^\]]*\]", lambda m: "x" if m.group().startswith("[") else "", head))
+
+
+def page_key(pattern: str) -> str | None:
+    """
+    Regex que identifica o exame numa página: a cabeça da regex (pattern_head)
+    como palavra inteira. None se a cabeça for curta demais para filtrar.
+    """
+    head = pattern_head(pattern)
+    while head.endswith(("\\s*", "\\s+")):
+        head = head[:-3]
+    if _head_letters(head) < PAGE_KEY_MIN_LETTERS:
+        return None
+    try:
+        re.compile(head)
+    except re.error:
+        return None
+    tail = r"(?!\w)" if head[-1:].isalnum() or head.endswith("]") else ""
+    return rf"(?<!\w)(?:{head}){tail}"
+
+
+def _compile_patterns(test_patterns):
+    compiled = []
+    for test_name, (pattern_str, group_map) in test_patterns:
+        compiled.append((
+            test_name,
+            re.compile(pattern_str, PATTERN_FLAGS),
+            group_map,
+            pattern_anchors(pattern_str),
+        ))
+    return compiled
+
+
+def _distinct_anchors(compiled_patterns) -> list[str]:
+    anchors = []
+    for _, _, _, pattern_anchors_ in compiled_patterns:
+        for anchor in pattern_anchors_:
+            if anchor not in anchors:
+                anchors.append(anchor)
+    return anchors
+
+
+COMPILED_PATTERNS = _compile_patterns(TEST_PATTERNS)
+ANCHORS = _distinct_anchors(COMPILED_PATTERNS)
+_FOLDED_ANCHORS = [(anchor, anchor.upper()) for anchor in ANCHORS]
+
+
+def _page_keys(compiled_patterns):
+    """
+    [(âncoras maiúsculas, regex da chave)] agrupado pela chave. A chave começa
+    pela âncora do padrão, então só precisa rodar se a âncora está no texto;
+    padrões sem âncora ficam com () e rodam sempre.
+    """
+    keys = {}
+    for _, regex, _, anchors in compiled_patterns:
+        key = page_key(regex.pattern)
+        if key:
+            keys.setdefault(key, set()).update(anchor.upper() for anchor in anchors)
+    return [(tuple(anchors), re.compile(key, re.IGNORECASE)) for key, anchors in keys.items()]
+
+
+PAGE_KEYS = _page_keys(COMPILED_PATTERNS)
+_ANCHOR_REGEXES = [(anchor, re.compile(re.escape(anchor), re.IGNORECASE)) for anchor in ANCHORS]
+
+
+# ---------- varredura --------------------------------------------------
+def _anchor_finder(text: str):
+    """
+    find(âncora, início) -> offset da próxima ocorrência da âncora (ou -1).
+    O texto é normalizado para maiúsculas uma única vez e cada busca vira um
+    str.find em C (bem mais rápido que uma alternação IGNORECASE com 100+
+    ramos testada em cada posição). Se a normalização mudar o tamanho do texto
+    (ex.: "ß" -> "SS") os offsets deixariam de bater, então cai no re.search
+    por âncora.
+    """
+    folded = text.upper()
+    if len(folded) == len(text):
+        folded_anchors = dict(_FOLDED_ANCHORS)
+        return lambda anchor, start=0: folded.find(folded_anchors[anchor], start)
+
+    anchor_regexes = dict(_ANCHOR_REGEXES)
+
+    def find(anchor, start=0):
+        m = anchor_regexes[anchor].search(text, start)
+        return m.start() if m else -1
+    return find
+
+
+def scan_anchors(text: str, find=None) -> dict[str, int]:
+    """Âncora -> offset da primeira ocorrência no laudo."""
+    find = find or _anchor_finder(text)
+    first_seen = {}
+    for anchor in ANCHORS:
+        pos = find(anchor)
+        if pos != -1:
+            first_seen[anchor] = pos
+    return first_seen
+
+
+# ---------- seções -----------------------------------------------------
+SECTION_HEADER = re.compile(r"Método\s*:", re.IGNORECASE)
+METHOD_END = re.compile(r"\b(?:Material|RESULTADO|Valores? de Refer)", re.IGNORECASE)
+TITLE_MAX_CHARS = 120  # título = até este tanto de texto antes do "Método:"
+TITLE_MAX_WORDS = 10
+METHOD_MAX_CHARS = 80
+# Fim do valor do exame anterior ("RESULTADO: 25", "RESULTADO: NEGATIVA",
+# "RESULTADO: NÃO REAGENTE"): o título seguinte nunca começa antes disso
+RESULT_VALUE = re.compile(
+    r"RESULTADO[^:\n]{0,40}:\s*(?:(?:N[ÃA]O|INFERIOR A|SUPERIOR A|MENOR QUE|MAIOR QUE)\s+)?\S+",
+    re.IGNORECASE,
+)
+# Unidade em maiúsculas após um valor ("U/L", "MG/DL", "/MM3", "%", "FL")
+UNIT_TOKEN = re.compile(r"[^\W\d_]*/(?:\d*[HL]|DL|ML|MM3?|MIN|UL)|%|FL|PG|MM3", re.IGNORECASE)
+
+
+class Section(NamedTuple):
+    start: int   # offset do título (ou 0 no preâmbulo)
+    end: int     # offset do título da seção seguinte (ou fim do texto)
+    title: str   # "" no preâmbulo (cabeçalho do paciente antes do 1º exame)
+    method: str
+
+
+def _anchors_by_last_word(anchors) -> dict[str, list[str]]:
+    """Última palavra (maiúscula) -> âncoras terminadas nela, da mais longa para a mais curta."""
+    index = {}
+    for anchor in anchors:
+        folded = anchor.upper().rstrip()
+        if folded:
+            index.setdefault(folded.split()[-1], []).append(folded)
+    for candidates in index.values():
+        candidates.sort(key=len, reverse=True)
+    return index
+
+
+_TITLE_ANCHORS = _anchors_by_last_word(ANCHORS)
+
+
+def _title_start(text: str, header: int, floor: int) -> int:
+    """
+    Onde começa o título do bloco cujo "Método:" está em `header`.
+    1) uma âncora de exame terminando logo antes do "Método:" (o caso comum:
+       "GLICOSE Método:", "HEMOGLOBINA GLICADA - HbA1c Método:");
+    2) senão, a sequência de palavras sem minúsculas imediatamente antes
+       ("VITAMINA D3 25-HIDROXI (25-OH) Método:"), parando em palavras sem
+       letras (valores), em unidades e no fim do último "RESULTADO: valor",
+       que são o fim do exame anterior.
+    Nunca recua antes de `floor` (fim do cabeçalho anterior).
+    """
+    window_start = max(floor, header - TITLE_MAX_CHARS)
+    before = text[window_start:header].rstrip()
+    title_end = window_start + len(before)
+    words = before.split()
+    if not words:
+        return title_end
+
+    for folded in _TITLE_ANCHORS.get(words[-1].upper(), ()):
+        pos = title_end - len(folded)
+        if pos >= window_start and text[pos:title_end].upper() == folded:
+            return pos
+
+    value_end = window_start
+    for m in RESULT_VALUE.finditer(text, window_start, title_end):
+        value_end = m.end()
+
+    start = title_end
+    for word in reversed(words[-TITLE_MAX_WORDS:]):
+        if word != word.upper() or word.endswith(":") or not any(c.isalpha() for c in word):
+            break
+        if UNIT_TOKEN.fullmatch(word.strip("()[],;")):
+            break
+        pos = text.rindex(word, window_start, start)
+        if pos < value_end:
+            break
+        start = pos
+    return start
+
+
+def segment_sections(text: str) -> list[Section]:
+    """
+    Divide o laudo em seções de exame, na ordem do texto. A primeira seção é o
+    preâmbulo (tudo antes do primeiro título), se houver. As seções cobrem o
+    texto inteiro, sem buracos nem sobreposição.
+    """
+    heads = []  # (início do título, offset do "Método:", fim do "Método:")
+    floor = 0
+    for m in SECTION_HEADER.finditer(text):
+        start = _title_start(text, m.start(), floor)
+        heads.append((start, m.start(), m.end()))
+        floor = m.end()
+
+    bounds = [start for start, _, _ in heads] + [len(text)]
+    sections = []
+    if bounds[0] > 0:
+        sections.append(Section(0, bounds[0], "", ""))
+    for (start, header, header_end), end in zip(heads, bounds[1:]):
+        method_text = text[header_end:min(end, header_end + METHOD_MAX_CHARS)]
+        cut = METHOD_END.search(method_text)
+        method = " ".join((method_text[:cut.start()] if cut else method_text).split())
+        sections.append(Section(start, end, " ".join(text[start:header].split()), method))
+    return sections
+
+
+def contains_anchor(text: str) -> bool:
+    """
+    True se o trecho contém o nome de algum exame (ex.: para filtrar páginas).
+    Usa PAGE_KEYS — o nome inteiro como a regex o escreve, em palavra
+    inteira — e não as âncoras curtas de busca: "HEM" ou "MON" casariam com
+    "hemólise" ou "Monteiro" em qualquer página de rodapé/assinatura.
+    """
+    text = " ".join(text.split())
+    folded = text.upper()
+    for anchors, key in PAGE_KEYS:
+        if (not anchors or any(anchor in folded for anchor in anchors)) and key.search(text):
+            return True
+    return False
+
+
+def _search_sections(text, regex, anchors, first_seen, find, sections, section_starts):
+    """
+    (match, caracteres varridos): o primeiro match contido inteiro numa seção.
+    Só as seções onde a âncora do padrão aparece são varridas, cada uma a
+    partir da ocorrência da âncora.
+    """
+    if anchors:
+        pos = min(first_seen[a] for a in anchors if a in first_seen)
+    else:
+        pos = 0
+    scanned = 0
+    while pos != -1:
+        section = sections[bisect_right(section_starts, pos) - 1]
+        match = regex.search(text, pos, section.end)
+        scanned += section.end - pos
+        if match:
+            return match, scanned
+        if anchors:
+            following = [p for p in (find(a, section.end) for a in anchors) if p != -1]
+            pos = min(following) if following else -1
+        else:
+            pos = section.end if section.end < len(text) else -1
+    return None, scanned
+
+
+def iter_test_matches(text: str, profiler=None, sectioned: bool = True):
+    """
+    Gera (test_name, match, group_map) na ordem de TEST_PATTERNS.
+    Cada padrão fica com o primeiro match que cabe inteiro numa seção do laudo
+    (ver segment_sections). Com sectioned=False o laudo é uma seção só, e o
+    resultado é o mesmo de re.search(pattern, text, re.IGNORECASE | re.DOTALL).
+    Em ambos os casos o match precisa começar numa âncora, então buscar a
+    partir das ocorrências da âncora não perde nenhum match.
+    Com `profiler` (ver pattern_profile.PatternProfiler), cada padrão que
+    chega a rodar é cronometrado e registrado com profiler.record(...).
+    """
+    find = _anchor_finder(text)
+    first_seen = scan_anchors(text, find)
+    if sectioned:
+        sections = segment_sections(text)
+    else:
+        sections = [Section(0, len(text), "", "")]
+    section_starts = [section.start for section in sections]
+
+    for test_name, regex, group_map, anchors in COMPILED_PATTERNS:
+        if anchors and not any(a in first_seen for a in anchors):
+            continue  # exame ausente no laudo
+        if profiler is None:
+            match, _ = _search_sections(text, regex, anchors, first_seen, find, sections, section_starts)
+        else:
+            start = time.perf_counter()
+            match, scanned = _search_sections(text, regex, anchors, first_seen, find, sections, section_starts)
+            profiler.record(test_name, regex.pattern, time.perf_counter() - start, match, scanned)
+        if match:
+            yield test_name, match, group_map
@@ -0,0 +1,123 @@
+import math
+import argparse
+from collections import defaultdict
+
+from pattern_engine import iter_test_matches
+from unimed import PAGE_MODES, TEXT_BACKENDS, list_input_files, read_text_content
+
+# Instrumentação opcional das regexes de TEST_PATTERNS.
+# Um PatternProfiler passado para iter_test_matches(text, profiler) (ou
+# process_text_content(text, profiler=...))
+# recebe, para cada padrão executado em cada laudo, o tempo de parede, se
+# houve match, o tamanho do match e quanto texto restava para a regex varrer.
+# report() agrega por padrão e ordena pelo tempo total: os primeiros da lista
+# são os candidatos a reescrever (ex.: ".*?" com DOTALL que atravessa o laudo).
+# Padrões cuja âncora não aparece no laudo não rodam e não entram na conta.
+
+PATTERN_PREVIEW = 70
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    """Percentil pelo método do posto mais próximo (lista já ordenada)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class PatternProfiler:
+    def __init__(self):
+        # (exame, padrão) -> [(segundos, casou, tamanho do match, texto varrido, laudo)]
+        self.samples = defaultdict(list)
+        self.document = None
+        self.documents = 0
+
+    def start_document(self, doc_id) -> None:
+        """Marca o laudo corrente (nome do arquivo, por exemplo)."""
+        self.document = doc_id
+        self.documents += 1
+
+    def record(self, test_name: str, pattern: str, seconds: float, match, scanned: int) -> None:
+        span = match.end() - match.start() if match else 0
+        self.samples[(test_name, pattern)].append((seconds, match is not None, span, scanned, self.document))
+
+    def summary(self) -> list[dict]:
+        """Uma linha por padrão, do mais caro (tempo total) para o mais barato."""
+        rows = []
+        for (test_name, pattern), samples in self.samples.items():
+            times = sorted(s[0] for s in samples)
+            worst = max(samples, key=lambda s: s[0])
+            matched = [s for s in samples if s[1]]
+            rows.append({
+                "exame": test_name,
+                "padrao": pattern,
+                "execucoes": len(samples),
+                "matches": len(matched),
+                "total": sum(times),
+                "media": sum(times) / len(times),
+                "p95": _percentile(times, 95),
+                "max": worst[0],
+                "pior_laudo": worst[4],
+                "span_max": max((s[2] for s in matched), default=0),
+                "varrido_medio": sum(s[3] for s in samples) / len(samples),
+            })
+        rows.sort(key=lambda row: row["total"], reverse=True)
+        return rows
+
+    def report(self, top: int = 20) -> list[str]:
+        rows = self.summary()
+        total = sum(row["total"] for row in rows)
+        lines = [
+            f"Laudos: {self.documents}   padrões executados: {len(rows)}   tempo em regex: {total:.3f}s",
+            "",
+            f"{'total ms':>9} {'%':>5} {'média µs':>9} {'p95 µs':>8} {'máx ms':>7} "
+            f"{'match':>9} {'span máx':>8} {'varrido':>8}  exame / pior laudo",
+        ]
+        for row in rows[:top]:
+            lines.append(
+                f"{1000 * row['total']:>9.2f} {100 * row['total'] / total if total else 0:>5.1f} "
+                f"{1e6 * row['media']:>9.1f} {1e6 * row['p95']:>8.1f} {1000 * row['max']:>7.2f} "
+                f"{row['matches']:>4}/{row['execucoes']:<4} {row['span_max']:>8} {row['varrido_medio']:>8.0f}  "
+                f"{row['exame']} / {row['pior_laudo']}"
+            )
+            pattern = row["padrao"]
+            if len(pattern) > PATTERN_PREVIEW:
+                pattern = pattern[:PATTERN_PREVIEW] + "…"
+            lines.append(f"{'':>9} {pattern}")
+        return lines
+
+
+# ---------- main -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Perfil das regexes de TEST_PATTERNS numa pasta de laudos.")
+    parser.add_argument("pasta")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--pages", choices=PAGE_MODES, default="all")
+    parser.add_argument("--backend", choices=list(TEXT_BACKENDS), default="words")
+    parser.add_argument("-o", "--output", default="pattern_profile_report.txt")
+    args = parser.parse_args()
+
+    profiler = PatternProfiler()
+    failures = []
+    for path in list_input_files(args.pasta):
+        profiler.start_document(path)
+        try:
+            # Só as regexes de exame (como bench_extraction): o cabeçalho do
+            # paciente e a classificação não entram no perfil nem o derrubam
+            text = read_text_content(path, args.pages, args.backend)
+            for _ in iter_test_matches(text, profiler):
+                pass
+        except Exception as e:
+            failures.append(f"{path}: {type(e).__name__}: {e}")
+
+    lines = profiler.report(args.top)
+    if failures:
+        lines += ["", f"Falhas ({len(failures)}):"] + failures
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    print("\n".join(lines[:3 + 2 * min(args.top, 5)]))
+    print(f"✅ Relatório: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
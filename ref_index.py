@@ -0,0 +1,204 @@
+from bisect import bisect_right
+
+from ref_table import DEFAULT_TABLE_PATH, read_ref_table
+
+# Índice pré-compilado das faixas de referência.
+# REF_VALUES vem do artefato compilado (ref_table.json, ver ref_table); o
+# import falha se ref_values_updated2.py mudou e o artefato não foi recompilado.
+# Para cada exame, as idades são divididas em faixas ("buckets") nos pontos em
+# que alguma condição de REF_VALUES começa ou termina (age_min, age_max + 1);
+# dentro de uma faixa, e para um mesmo sexo, a referência escolhida é sempre a
+# mesma. O índice guarda, por (exame, sexo, faixa de idade), a referência já
+# escolhida e a string de exibição pronta, então classificar um valor vira um
+# lookup + uma comparação.
+#
+# Entrada do índice: (tipo, mínimo, máximo, esperados, mantém_ok, ref_str)
+#   tipo "numeric":     mínimo/máximo (None = sem limite daquele lado)
+#   tipo "qualitative": esperados = conjunto em maiúsculas
+#   tipo "invalid":     referência mal definida -> status "?"
+#   tipo "text":        tipo de referência sem comparação -> status ""
+#   tipo "missing":     nenhuma referência aplicável -> status "?"
+
+_OTHER_GENDER = "\0"  # sexo informado mas sem condição específica no exame
+
+
+# ---------- seleção (regra original de check_reference) ----------------
+def select_reference(ref_info: dict, patient_age, patient_gender) -> dict | None:
+    """Escolhe a condição de referência aplicável à idade/sexo do paciente."""
+    # Filter applicable references based on patient_age and patient_gender
+    # Prioritize more specific conditions using the 'priority' field
+    applicable_refs = []
+    for ref_condition in ref_info.get("references", []):
+        condition_met = True
+
+        # Check gender condition
+        if ref_condition.get("gender") and patient_gender:
+            if ref_condition["gender"].upper() != patient_gender.upper():
+                condition_met = False
+
+        # Check age condition (if patient age is available)
+        if patient_age is not None:
+            age_min = ref_condition.get("age_min")
+            age_max = ref_condition.get("age_max")
+
+            if age_min is not None and patient_age < age_min:
+                condition_met = False
+            if age_max is not None and patient_age > age_max: # age_max is inclusive
+                condition_met = False
+
+        if condition_met:
+            applicable_refs.append(ref_condition)
+
+    # Sort by priority (descending), so higher priority references are checked first
+    applicable_refs.sort(key=lambda r: r.get("priority", 0), reverse=True)
+
+    if applicable_refs:
+        # If multiple have the same highest priority, the first one encountered (due to sort stability) is chosen.
+        return applicable_refs[0]
+
+    # Fallback to a general reference if no specific condition matched, by looking for a "Geral" condition
+    for ref_condition in ref_info.get("references", []):
+        if ref_condition.get("condition", "").lower() == "geral" or \
+           (ref_condition.get("gender") is None and ref_condition.get("age_min") is None):
+            return ref_condition
+
+    # If still no chosen_ref, use the very first one as a last resort
+    if ref_info.get("references"):
+        return ref_info["references"][0]
+    return None
+
+
+def compile_reference(ref_info: dict, chosen_ref: dict | None) -> tuple:
+    """Pré-calcula a comparação e a string de exibição de uma referência."""
+    if not chosen_ref:
+        return ("missing", None, None, None, False, "Referência não aplicável/encontrada para idade/gênero")
+
+    ref_str = chosen_ref.get("condition", "") + ": "
+    ref_type = chosen_ref.get("type", "range") # Default to "range"
+    unit = ref_info.get("unit", "")
+    ref_min = chosen_ref.get("min")
+    ref_max = chosen_ref.get("max")
+
+    # --- Quantitative Comparisons ----
+    if ref_type == "range":
+        if ref_min is not None and ref_max is not None:
+            return ("numeric", ref_min, ref_max, None, False, ref_str + f"{ref_min}-{ref_max} {unit}".strip())
+        return ("invalid", None, None, None, False, ref_str + "Intervalo inválido")
+    if ref_type == "min_inclusive":
+        if ref_min is not None:
+            return ("numeric", ref_min, None, None, False, ref_str + f">={ref_min} {unit}".strip())
+        return ("invalid", None, None, None, False, ref_str + "Mínimo inválido")
+    if ref_type == "max_inclusive":
+        if ref_max is not None:
+            return ("numeric", None, ref_max, None, False, ref_str + f"<={ref_max} {unit}".strip())
+        return ("invalid", None, None, None, False, ref_str + "Máximo inválido")
+    if ref_type == "range_inclusive_lower_bound": # For ranges like "< 0.10 a 0.40"
+        if ref_min is not None and ref_max is not None:
+            return ("numeric", ref_min, ref_max, None, False, ref_str + f"<{ref_min} a {ref_max} {unit}".strip())
+        return ("invalid", None, None, None, False, ref_str + "Intervalo inválido")
+    # --- Qualitative Comparisons -----
+    if ref_type == "qualitative":
+        expected = chosen_ref.get("expected")
+        if expected:
+            exp_list = expected if isinstance(expected, list) else [expected]
+            # Single expected value keeps "OK"; several acceptable values -> ""
+            keep_ok = len(chosen_ref.get("expected", [])) == 1
+            return ("qualitative", None, None, frozenset(e.upper() for e in exp_list), keep_ok,
+                    ref_str + ", ".join(exp_list))
+        return ("invalid", None, None, None, False, ref_str + "Valores esperados não definidos")
+    return ("text", None, None, None, False, ref_str)
+
+
+# ---------- índice -----------------------------------------------------
+def _age_breakpoints(ref_info: dict) -> list:
+    points = set()
+    for ref_condition in ref_info.get("references", []):
+        if ref_condition.get("age_min") is not None:
+            points.add(ref_condition["age_min"])
+        if ref_condition.get("age_max") is not None:
+            points.add(ref_condition["age_max"] + 1)  # age_max is inclusive
+    return sorted(points)
+
+
+def _compile_test(ref_info: dict) -> tuple:
+    """(breakpoints, sexos com condição própria, tabela (sexo, faixa) -> entrada)."""
+    breakpoints = _age_breakpoints(ref_info)
+    genders = {
+        r["gender"].upper() for r in ref_info.get("references", []) if r.get("gender")
+    }
+    # Idade representativa de cada faixa; None = idade desconhecida
+    bucket_ages = [(None, None)]
+    for i in range(len(breakpoints) + 1):
+        bucket_ages.append((i, breakpoints[i - 1] if i else (breakpoints[0] - 1 if breakpoints else 0)))
+
+    table = {}
+    for gender in [None, _OTHER_GENDER, *genders]:
+        for bucket, age in bucket_ages:
+            chosen_ref = select_reference(ref_info, age, gender)
+            table[(gender, bucket)] = compile_reference(ref_info, chosen_ref)
+    return breakpoints, genders, table
+
+
+def build_reference_index(ref_values) -> dict:
+    """Exame -> índice compilado. Nomes repetidos: vale o último, como em dict()."""
+    ref_dict = {name: info for name, info in ref_values}
+    return {
+        name: (info, *_compile_test(info))
+        for name, info in ref_dict.items()
+        if info
+    }
+
+
+def load_reference_index(path: str = DEFAULT_TABLE_PATH) -> tuple[dict, str]:
+    """Índice compilado direto do artefato de ref_table, com o hash do conteúdo."""
+    table = read_ref_table(path)
+    return build_reference_index(table.ref_values), table.content_hash
+
+
+REF_TABLE = read_ref_table()
+REF_VALUES = REF_TABLE.ref_values
+REF_TABLE_HASH = REF_TABLE.content_hash
+REF_INDEX = build_reference_index(REF_VALUES)
+
+
+def lookup_reference(test_name: str, patient_age, patient_gender, index: dict = REF_INDEX) -> tuple | None:
+    """Entrada compilada para o paciente, ou None se o exame não tem referência."""
+    compiled = index.get(test_name)
+    if compiled is None:
+        return None
+    ref_info, breakpoints, genders, table = compiled
+
+    if patient_age is not None and not isinstance(patient_age, int):
+        # Faixas assumem idade em anos inteiros; fora disso aplica a regra direto
+        return compile_reference(ref_info, select_reference(ref_info, patient_age, patient_gender))
+
+    if not patient_gender:
+        gender = None
+    else:
+        gender = patient_gender.upper()
+        if gender not in genders:
+            gender = _OTHER_GENDER
+    bucket = None if patient_age is None else bisect_right(breakpoints, patient_age)
+    return table[(gender, bucket)]
+
+
+def classify_value(entry: tuple, value) -> tuple[str, str]:
+    """(status, ref_str) de um valor contra uma entrada compilada."""
+    kind, ref_min, ref_max, expected, keep_ok, ref_str = entry
+    if kind == "numeric":
+        try:
+            num = float(value)
+        except ValueError:
+            return "?", ref_str  # Not numeric where it should be
+        if ref_min is not None and num < ref_min:
+            return "↓", ref_str
+        if ref_max is not None and num > ref_max:
+            return "↑", ref_str
+        return "", ref_str  # Within range
+    if kind == "qualitative":
+        if str(value).strip().upper() in expected:
+            return ("OK" if keep_ok else ""), ref_str
+        return "≠", ref_str
+    if kind == "text":
+        return "", ref_str
+    return "?", ref_str
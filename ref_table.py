@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import argparse
+import importlib
+import importlib.util
+from typing import NamedTuple
+
+# Tabela de referências compilada: o REF_VALUES (lista Python de
+# ref_values_updated2.py) convertido uma vez para um artefato JSON versionado,
+# com o hash do conteúdo no cabeçalho:
+#
+#   {"schema": "unimed-ref-table", "schema_version": 1, "content_hash": "<sha256>",
+#    "source": "ref_values_updated2", "source_hash": "<sha256 do .py>",
+#    "n_tests": 120, "ref_values": [[exame, info], ...]}
+#
+# ref_index carrega o artefato (json.loads, sem compilar um literal de 900
+# linhas em cada processo do pool) e monta o índice a partir dele; o hash vai
+# para a versão das regras do cache de extração (extraction_cache).
+# Depois de editar ref_values_updated2.py:  python ref_table.py compile
+# source_hash é o sha256 dos bytes do módulo de origem no momento da
+# compilação; ao carregar, se o módulo (ao lado do artefato ou no sys.path)
+# não bate mais com ele, read_ref_table falha em vez de usar faixas velhas.
+
+SCHEMA = "unimed-ref-table"
+SCHEMA_VERSION = 1
+DEFAULT_SOURCE = "ref_values_updated2"
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ref_table.json")
+
+
+class RefTable(NamedTuple):
+    ref_values: list     # [(exame, info), ...], mesmo formato de REF_VALUES
+    content_hash: str
+    source: str
+
+
+def content_hash(ref_values) -> str:
+    """sha256 da forma canônica (chaves ordenadas) de REF_VALUES."""
+    canonical = json.dumps(ref_values, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def source_path(source: str, table_path: str = DEFAULT_TABLE_PATH) -> str | None:
+    """Arquivo .py do módulo de origem: ao lado do artefato ou, senão, no sys.path (sem importar)."""
+    candidate = os.path.join(os.path.dirname(os.path.abspath(table_path)), source + ".py")
+    if os.path.isfile(candidate):
+        return candidate
+    try:
+        spec = importlib.util.find_spec(source)
+    except (ImportError, ValueError):
+        return None
+    return spec.origin if spec and spec.origin and os.path.isfile(spec.origin) else None
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_ref_table(ref_values, path: str = DEFAULT_TABLE_PATH, source: str = DEFAULT_SOURCE,
+                    source_file: str | None = None) -> str:
+    """Grava o artefato (tmp + rename). Retorna o hash do conteúdo."""
+    digest = content_hash(ref_values)
+    source_file = source_file or source_path(source, path)
+    doc = {
+        "schema": SCHEMA,
+        "schema_version": SCHEMA_VERSION,
+        "content_hash": digest,
+        "source": source,
+        "source_hash": file_hash(source_file) if source_file else None,
+        "n_tests": len(ref_values),
+        "ref_values": [[name, info] for name, info in ref_values],
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+        f.write("\n")
+    os.replace(tmp_path, path)
+    return digest
+
+
+def read_ref_table(path: str = DEFAULT_TABLE_PATH) -> RefTable:
+    """Lê e valida o artefato (schema, versão e hash do conteúdo)."""
+    try:
+        with open(path, "rb") as f:
+            doc = json.loads(f.read())
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            f"Tabela de referências não encontrada: {path} (gere com: python ref_table.py compile)"
+        ) from None
+    if doc.get("schema") != SCHEMA or doc.get("schema_version") != SCHEMA_VERSION:
+        raise ValueError(f"{path} não é uma tabela de referências v{SCHEMA_VERSION} ({SCHEMA})")
+    ref_values = [(name, info) for name, info in doc["ref_values"]]
+    digest = content_hash(ref_values)
+    if digest != doc["content_hash"]:
+        raise ValueError(f"{path}: hash do conteúdo não confere (arquivo editado à mão ou corrompido)")
+    source = doc.get("source", "")
+    _check_source(path, source, doc.get("source_hash"))
+    return RefTable(ref_values, digest, source)
+
+
+def _check_source(path: str, source: str, expected: str | None) -> None:
+    """Falha se o módulo de origem mudou depois da compilação (sem o módulo ou sem hash, não há o que checar)."""
+    if not source or not expected:
+        return
+    source_file = source_path(source, path)
+    if source_file and file_hash(source_file) != expected:
+        raise ValueError(
+            f"{path} está desatualizado: {source_file} mudou depois da compilação "
+            f"(regere com: python ref_table.py compile {source})"
+        )
+
+
+def compile_module(module_name: str = DEFAULT_SOURCE, path: str = DEFAULT_TABLE_PATH) -> str:
+    """Converte o REF_VALUES de um módulo Python (ref_values_updated2, ...) no artefato."""
+    module = importlib.import_module(module_name)
+    return write_ref_table(module.REF_VALUES, path, source=module_name, source_file=module.__file__)
+
+
+# ---------- main -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Tabela de referências compilada (REF_VALUES -> JSON com hash).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_compile = sub.add_parser("compile", help="Converte o REF_VALUES de um módulo Python.")
+    p_compile.add_argument("modulo", nargs="?", default=DEFAULT_SOURCE)
+    p_compile.add_argument("-o", "--output", default=DEFAULT_TABLE_PATH)
+    p_info = sub.add_parser("info", help="Valida um artefato e mostra versão e hash.")
+    p_info.add_argument("tabela", nargs="?", default=DEFAULT_TABLE_PATH)
+    args = parser.parse_args()
+
+    if args.cmd == "compile":
+        digest = compile_module(args.modulo, args.output)
+        print(f"✅ {args.output} gerado a partir de {args.modulo} (hash {digest[:16]})")
+        return
+    table = read_ref_table(args.tabela)
+    print(f"✅ {args.tabela}: {len(table.ref_values)} exame(s), origem {table.source}, hash {table.content_hash}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from ref_index import REF_INDEX, lookup_reference
+from result_writers import PATIENT_COLS, is_value_field, split_result_key
+
+# Reclassificação em lote: recalcula as colunas de status/ref de um resultado
+# já extraído (CSV/Parquet largo ou Parquet longo) contra o REF_VALUES atual,
+# sem reabrir nenhum PDF. Para cada exame, as linhas são agrupadas pelos pares
+# (sexo, idade) distintos — poucas centenas —, cada par resolve sua entrada no
+# índice de ref_index uma vez, e a comparação com mínimo/máximo é feita com
+# arrays NumPy sobre todas as linhas do exame de uma vez.
+# Mesma regra e mesmas strings de check_reference; valores ausentes (exame
+# não realizado) ficam com status/ref nulos.
+
+_KIND_CODES = {"numeric": 0, "qualitative": 1, "text": 2, "invalid": 3, "missing": 3}
+
+
+def _as_float_array(values: pd.Series) -> np.ndarray:
+    """float(valor) por linha (NaN onde float() falharia), convertendo cada valor distinto uma vez."""
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.to_numpy(dtype=float, na_value=np.nan)
+
+    def to_float(v):
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return np.nan
+
+    codes, uniques = pd.factorize(values)
+    converted = np.array([to_float(v) for v in uniques] + [np.nan], dtype=float)
+    return converted[codes]  # código -1 (nulo) cai no NaN final
+
+
+def _patient_keys(ages: pd.Series, sexes: pd.Series) -> tuple[np.ndarray, list]:
+    """Código por linha + lista de (idade, sexo) distintos na forma aceita por lookup_reference."""
+    age_codes, age_uniques = pd.factorize(ages)
+    sex_codes, sex_uniques = pd.factorize(sexes)
+    # -1 (nulo) vira 0; os valores reais começam em 1
+    combined = (sex_codes + 1) * (len(age_uniques) + 1) + (age_codes + 1)
+    keys, inverse = np.unique(combined, return_inverse=True)
+
+    pairs = []
+    for key in keys:
+        sex_code, age_code = divmod(int(key), len(age_uniques) + 1)
+        age = age_uniques[age_code - 1] if age_code else None
+        sex = sex_uniques[sex_code - 1] if sex_code else None
+        if age is not None:
+            age = float(age)
+            age = int(age) if age.is_integer() else age
+        pairs.append((age, None if sex is None else str(sex)))
+    return inverse, pairs
+
+
+def grade_values(test_name: str, values: pd.Series, ages: pd.Series, sexes: pd.Series,
+                 text_values: pd.Series | None = None) -> tuple[pd.Series, pd.Series]:
+    """
+    Status e ref de todas as linhas de um exame.
+    `values` são os resultados (numéricos ou texto); no layout longo,
+    `text_values` traz os resultados qualitativos da coluna valor_texto.
+    Retorna duas Series (status, ref) alinhadas ao índice de `values`.
+    """
+    index = values.index
+    n = len(values)
+    status = np.full(n, None, dtype=object)
+    refs = np.full(n, None, dtype=object)
+
+    raw = values.astype(object).where(values.notna(), None)
+    if text_values is not None:
+        raw = raw.where(raw.notna(), text_values.astype(object).where(text_values.notna(), None))
+    present = raw.notna().to_numpy()
+    if not present.any():
+        return pd.Series(status, index=index), pd.Series(refs, index=index)
+
+    if test_name not in REF_INDEX:
+        status[present] = "?"
+        refs[present] = "Referência não encontrada"
+        return pd.Series(status, index=index), pd.Series(refs, index=index)
+
+    inverse, pairs = _patient_keys(ages.reset_index(drop=True), sexes.reset_index(drop=True))
+    entries = [lookup_reference(test_name, age, sex) for age, sex in pairs]
+
+    kind = np.array([_KIND_CODES[e[0]] for e in entries])[inverse]
+    lo = np.array([np.nan if e[1] is None else e[1] for e in entries], dtype=float)[inverse]
+    hi = np.array([np.nan if e[2] is None else e[2] for e in entries], dtype=float)[inverse]
+    ref_str = np.array([e[5] for e in entries], dtype=object)[inverse]
+
+    # --- quantitativos: comparação vetorizada contra mínimo/máximo por linha ---
+    num = _as_float_array(raw.reset_index(drop=True))
+    with np.errstate(invalid="ignore"):
+        below = num < lo   # NaN (sem limite) nunca compara verdadeiro
+        above = num > hi
+    numeric_status = np.where(below, "↓", np.where(above, "↑", "")).astype(object)
+    non_numeric = np.isnan(num) & present
+    numeric_status[non_numeric] = "?"
+    is_numeric = kind == 0
+    status[is_numeric] = numeric_status[is_numeric]
+
+    # --- qualitativos: conjunto esperado por (par, valor) distinto ---
+    qualitative_rows = np.flatnonzero((kind == 1) & present)
+    if len(qualitative_rows):
+        memo = {}
+        raw_values = raw.to_numpy()
+        for row in qualitative_rows:
+            key = (inverse[row], raw_values[row])
+            if key not in memo:
+                _, _, _, expected, keep_ok, _ = entries[inverse[row]]
+                if str(raw_values[row]).strip().upper() in expected:
+                    memo[key] = "OK" if keep_ok else ""
+                else:
+                    memo[key] = "≠"
+            status[row] = memo[key]
+
+    status[kind == 2] = ""
+    status[kind == 3] = "?"
+
+    status[~present] = None
+    refs[present] = ref_str[present]
+    return pd.Series(status, index=index), pd.Series(refs, index=index)
+
+
+# ---------- layouts ----------------------------------------------------
+def regrade_wide(df: pd.DataFrame, age_col: str = "idade", sex_col: str = "sexo") -> pd.DataFrame:
+    """Recalcula todas as colunas "<exame>_status"/"<exame>_ref" de um resultado largo."""
+    out = df.copy()
+    ages, sexes = df[age_col], df[sex_col]
+    for col in df.columns:
+        if not is_value_field(col) or f"{col}_status" not in df.columns:
+            continue
+        test_name, _ = split_result_key(col)
+        status, refs = grade_values(test_name, df[col], ages, sexes)
+        out[f"{col}_status"] = status
+        out[f"{col}_ref"] = refs
+    return out
+
+
+def regrade_long(df: pd.DataFrame, test_col: str = "exame", value_col: str = "valor",
+                 text_col: str = "valor_texto", age_col: str = "idade",
+                 sex_col: str = "sexo") -> pd.DataFrame:
+    """Recalcula status/ref de um resultado no layout longo (uma linha por exame)."""
+    out = df.copy()
+    status = pd.Series(None, index=df.index, dtype=object)
+    refs = pd.Series(None, index=df.index, dtype=object)
+    text_values = df[text_col] if text_col in df.columns else None
+    for test_name, rows in df.groupby(test_col, observed=True, sort=False).groups.items():
+        s, r = grade_values(
+            str(test_name), df.loc[rows, value_col], df.loc[rows, age_col], df.loc[rows, sex_col],
+            None if text_values is None else text_values.loc[rows],
+        )
+        status.loc[rows] = s
+        refs.loc[rows] = r
+    out["status"] = status
+    out["ref"] = refs
+    return out
+
+
+def regrade(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """Detecta o layout (coluna "exame" = longo) e reclassifica."""
+    if "exame" in df.columns and "exame" not in PATIENT_COLS:
+        return regrade_long(df, **kwargs)
+    return regrade_wide(df, **kwargs)
+
+
+# ---------- main -------------------------------------------------------
+def default_output_path(entrada: str) -> str:
+    """<entrada>.regraded.<ext>: a entrada (única cópia da extração) fica intacta."""
+    base, ext = os.path.splitext(entrada)
+    return f"{base}.regraded{ext}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reclassifica status/ref de um resultado já extraído.")
+    parser.add_argument("entrada", help="CSV ou Parquet gerado por unimed.py")
+    parser.add_argument("saida", nargs="?", help="Arquivo de saída (padrão: <entrada>.regraded.<ext>)")
+    parser.add_argument("--in-place", action="store_true", help="Sobrescreve a própria entrada.")
+    args = parser.parse_args()
+
+    if args.in_place and args.saida:
+        parser.error("use a saída ou --in-place, não os dois")
+    saida = args.entrada if args.in_place else (args.saida or default_output_path(args.entrada))
+    if args.entrada.lower().endswith(".parquet"):
+        df = pd.read_parquet(args.entrada)
+    else:
+        # Mantém as colunas de texto como texto, igual ao CSV original
+        df = pd.read_csv(args.entrada, dtype={c: str for c in ("nome", "codigo_os", "cpf")}, keep_default_na=False, na_values=[""])
+
+    df = regrade(df)
+
+    # tmp + rename: com --in-place, uma falha no meio não destrói a entrada
+    tmp_path = saida + ".tmp"
+    if saida.lower().endswith(".parquet"):
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, saida)
+    print(f"✅ Reclassificado: {saida} ({len(df)} linhas)")
+
+
+if __name__ == "__main__":
+    main()
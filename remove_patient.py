@@ -1,7 +1,12 @@
 import os
 import re
+import zipfile
+import argparse
 import fitz  # PyMuPDF
 
+from corpus_reader import iter_members, map_members, read_member_bytes
+from packed_corpus import PackedCorpusWriter
+
 # ────────────────────────────────────────────────────────────────────────────────
 # 1. Padrões a remover
 # ────────────────────────────────────────────────────────────────────────────────
@@ -18,95 +23,178 @@ PACIENTE_REGEX = re.compile(
     re.DOTALL,
 )
 
-HEADER_KEYWORDS = re.compile(
-    r"(Unidade\s*:|Responsável Técnico:|Endereço da Unidade:|Laboratório inscrito sob CRM)",
+_HEADER = r"(?:Unidade\s*:|Responsável Técnico:|Endereço da Unidade:|Laboratório inscrito sob CRM)"
+
+HEADER_KEYWORDS = re.compile(_HEADER, re.IGNORECASE)
+
+# Classificador de linha em uma passada só (aplicado à linha sem espaços nas
+# pontas, com match() na posição 0). As alternativas reproduzem a ordem dos
+# filtros originais:
+#   • "release": linha de liberação/assinatura eletrônica -> remove esta e a
+#     próxima (CRM/CRF); só vale se a linha não tiver também um cabeçalho,
+#     que tinha precedência e não pulava a seguinte;
+#   • cabeçalhos e "ASSINATURA DIGITAL" em qualquer ponto da linha;
+#   • hash longo puramente hexadecimal, ≥30 caracteres (a linha inteira).
+LINE_FILTER = re.compile(
+    r"(?P<release>(?:(?:exame )?liberado|assinado) eletronicamente por)(?!.*?" + _HEADER + r")"
+    r"|.*?(?:" + _HEADER + r"|assinatura digital)"
+    r"|[A-F0-9]{30,}$",
     re.IGNORECASE,
 )
 
+DEFAULT_OUTPUT = "txt_anonimizados"
+
 # ────────────────────────────────────────────────────────────────────────────────
-def extract_text_from_pdf(pdf_path: str) -> str:
+def extract_text_from_pdf(pdf_path: str, data: bytes | None = None) -> str:
     """Extrai texto preservando quebras de linha para filtrar por linha."""
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        text += page.get_text("text", sort=True)
-    return text
+    with (fitz.open(pdf_path) if data is None else fitz.open(stream=data, filetype="pdf")) as doc:
+        return "".join(page.get_text("text", sort=True) for page in doc)
 
-# ────────────────────────────────────────────────────────────────────────────────
-def save_anon_txt(directory_path: str) -> None:
-    txt_dir = os.path.join('/Users/nicholasloureiro/unimedpdf', "txt_anonimizados")
-    os.makedirs(txt_dir, exist_ok=True)
+def anonymize_text(raw_text: str) -> str:
+    """Remove o bloco do paciente e as linhas de cabeçalho/assinatura de um laudo."""
+    # Remove bloco de paciente inteiro
+    text = PACIENTE_REGEX.sub("", raw_text)
 
+    filtered_lines = []
     skip_next = False  # controla se devemos pular a linha subsequente
-
-    for filename in os.listdir(directory_path):
-        if not filename.lower().endswith(".pdf"):
+    classify = LINE_FILTER.match
+    for line in text.splitlines():
+        # Se instruído a pular esta linha (ex.: logo após “Liberado eletronicamente …”)
+        if skip_next:
+            skip_next = False
             continue
+        m = classify(line.strip())
+        if m is None:
+            # Linha passou pelos filtros → mantém
+            filtered_lines.append(line)
+        elif m.group("release") is not None:
+            skip_next = True  # pula também a próxima (CRM/CRF)
+
+    return "\n".join(filtered_lines).strip()
+
+def txt_name_for(member_name: str) -> str:
+    """
+    Nome do TXT a partir do caminho relativo do laudo no corpus: subpastas
+    viram "__" ("2024/jan/laudo.pdf" -> "2024__jan__laudo.txt"), então PDFs
+    homônimos em pastas diferentes não se sobrescrevem.
+    """
+    relative = member_name.replace("\\", "/").lstrip("/")
+    parts = [part for part in relative.split("/") if part not in ("", ".")]
+    return f"{os.path.splitext('__'.join(parts))[0]}.txt"
+
+def _anonymize_member_safe(member):
+    """Roda no pool: (nome do TXT, texto anonimizado, erro)."""
+    txt_name = txt_name_for(member.name)
+    try:
+        raw_text = extract_text_from_pdf(member.name, data=read_member_bytes(member))
+        return txt_name, anonymize_text(raw_text), None
+    except Exception as e:
+        return txt_name, None, f"{type(e).__name__}: {e}"
+
+def iter_anonymized(directory_path: str, workers: int = 1):
+    """(nome do TXT, texto anonimizado, erro) de cada PDF de `directory_path`, na ordem do corpus."""
+    members = iter_members(directory_path, extensions=(".pdf",))
+    yield from map_members(_anonymize_member_safe, members, workers=workers)
 
-        print(f"📄 Processando: {filename}")
-        raw_text = extract_text_from_pdf(os.path.join(directory_path, filename))
+# ────────────────────────────────────────────────────────────────────────────────
+# 2. Destinos: pasta de TXT, ZIP ou corpus empacotado (.pack)
+# ────────────────────────────────────────────────────────────────────────────────
+class _DirOutput:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
 
-        # Remove bloco de paciente inteiro
-        text = PACIENTE_REGEX.sub("", raw_text)
+    def add(self, name: str, text: str) -> str:
+        txt_path = os.path.join(self.path, name)
+        with open(txt_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return txt_path
 
-        filtered_lines = []
-        for line in text.splitlines():
-            l_strip = line.strip()
+    def close(self) -> None:
+        pass
 
-            # Se instruído a pular esta linha (ex.: logo após “Liberado eletronicamente …”)
-            if skip_next:
-                skip_next = False
-                continue
+class _ZipOutput:
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
 
-            # 1. Cabeçalhos já definidos
-            if HEADER_KEYWORDS.search(l_strip):
-                continue
+    def add(self, name: str, text: str) -> str:
+        self._zip.writestr(name, text.encode("utf-8"))
+        return f"{self.path}:{name}"
 
-            # 2. Linhas de liberação eletrônica
-            if l_strip.lower().startswith("liberado eletronicamente por"):
-                skip_next = True  # pula também a próxima (CRM/CRF)
-                continue
+    def close(self) -> None:
+        self._zip.close()
 
-            if l_strip.lower().startswith("assinado eletronicamente por"):
-                skip_next = True  # pula também a próxima (CRM/CRF)
-                continue
+class _PackOutput:
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = PackedCorpusWriter(path)
 
-            if l_strip.lower().startswith("exame liberado eletronicamente por"):
-                skip_next = True  # pula também a próxima (CRM/CRF)
-                continue
+    def add(self, name: str, text: str) -> str:
+        self._writer.add(name, text)
+        return f"{self.path}:{name}"
 
-      
+    def close(self) -> None:
+        self._writer.close()
 
-            # 3. Linhas contendo “ASSINATURA DIGITAL”
-            if "assinatura digital" in l_strip.lower():
-                continue
+def open_output(path: str):
+    """Destino pela extensão: .pack (packed_corpus), .zip, ou pasta."""
+    if path.lower().endswith(".pack"):
+        return _PackOutput(path)
+    if path.lower().endswith(".zip"):
+        return _ZipOutput(path)
+    return _DirOutput(path)
 
-            # 4. Hash longo pura­mente hexadecimal/alfa, ≥30 caracteres
-            if re.fullmatch(r"[A-F0-9]{30,}", l_strip, flags=re.IGNORECASE):
+# ────────────────────────────────────────────────────────────────────────────────
+def save_anon_txt(directory_path: str, output_path: str = DEFAULT_OUTPUT, workers: int = 1) -> list[str]:
+    """
+    Anonimiza os PDFs de `directory_path` (pasta, ZIP ou tar) e grava um TXT
+    por laudo em `output_path`: pasta, .zip ou .pack. Com workers > 1 a
+    extração e o filtro rodam num pool de processos; a gravação fica no
+    processo principal, na ordem dos arquivos. Retorna os que falharam.
+    Um nome de TXT nunca é gravado duas vezes: a repetição conta como falha.
+    """
+    failed = []
+    written = set()
+    output = open_output(output_path)
+    try:
+        for txt_name, anon_text, erro in iter_anonymized(directory_path, workers):
+            if not erro and txt_name in written:
+                erro = "nome de TXT repetido no corpus (não sobrescrito)"
+            if erro:
+                print(f"❌ Falha em {txt_name}: {erro}")
+                failed.append(txt_name)
                 continue
-
-            # Linha passou pelos filtros → mantém
-            filtered_lines.append(line)
-
-        anon_text = "\n".join(filtered_lines).strip()
-
-        txt_path = os.path.join(
-            txt_dir, f"{os.path.splitext(filename)[0]}.txt"
-        )
-        with open(txt_path, "w", encoding="utf-8") as f:
-            f.write(anon_text)
-
-        print(f"   ↳ TXT salvo: {txt_path}")
-
+            written.add(txt_name)
+            print(f"📄 Processado: {txt_name}")
+            print(f"   ↳ TXT salvo: {output.add(txt_name, anon_text)}")
+    finally:
+        output.close()
+
+    if failed:
+        print(f"⚠️ {len(failed)} arquivo(s) com falha: {', '.join(failed)}")
     print("\n✅ Conversão concluída.")
+    return failed
 
 # ────────────────────────────────────────────────────────────────────────────────
 def main() -> None:
-    directory_path = "/Users/nicholasloureiro/Downloads/amostra 2"  # ajuste se precisar
-    if not os.path.isdir(directory_path):
+    parser = argparse.ArgumentParser(description="Gera TXT anonimizados a partir de laudos PDF.")
+    parser.add_argument(
+        "pasta", nargs="?",
+        default="/Users/nicholasloureiro/Downloads/amostra 2",  # ajuste se precisar
+        help="Pasta, ZIP ou tar com os PDFs.",
+    )
+    parser.add_argument(
+        "-o", "--output", default=DEFAULT_OUTPUT,
+        help="Pasta de saída, ou arquivo .zip / .pack (corpus empacotado).",
+    )
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Processos em paralelo (0 = todos os núcleos).")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.pasta):
         print("❌ Diretório inválido!")
         return
-    save_anon_txt(directory_path)
+    save_anon_txt(args.pasta, args.output, workers=args.workers or os.cpu_count() or 1)
 
 if __name__ == "__main__":
     main()
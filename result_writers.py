@@ -0,0 +1,340 @@
+import os
+import csv
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # só necessário para a saída Parquet
+    pa = pq = None
+
+from test_patterns2 import TEST_PATTERNS
+
+# Saída do extrator em streaming: cada laudo processado é gravado (e dado flush)
+# imediatamente num arquivo "spill" JSON Lines, então a memória não cresce com
+# o tamanho do lote e um lote interrompido no meio ainda deixa em disco tudo o
+# que já foi extraído. No fim, o spill é convertido no formato final:
+#   • CSV largo de sempre (colunas do paciente primeiro, exames em ordem alfabética)
+#   • Parquet largo tipado (valores float64, _status/_ref dictionary-encoded)
+#   • Parquet longo/tidy: uma linha por (paciente, exame)
+
+PATIENT_COLS = [
+    "nome",
+    "codigo_os",
+    "data_nascimento",
+    "idade", # New field
+    "sexo",    # New field
+    "cpf",
+    "medico",
+    "atendimento",
+    "convenio",
+    "quantidade_exames",
+]
+
+SPILL_SUFFIX = ".partial.jsonl"
+PARQUET_BATCH_ROWS = 5000
+
+TEST_NAMES = {test_name for test_name, _ in TEST_PATTERNS}
+
+
+# ---------- utilidades -------------------------------------------------
+def ordered_fieldnames(all_fields) -> list[str]:
+    """Colunas do paciente no início, depois as demais chaves ordenadas."""
+    other_cols = sorted(c for c in all_fields if c not in PATIENT_COLS)
+    return PATIENT_COLS + other_cols
+
+
+def is_value_field(field: str) -> bool:
+    """Coluna de valor de exame (não é do paciente nem _status/_ref)."""
+    return field not in PATIENT_COLS and not field.endswith(("_status", "_ref"))
+
+
+def split_result_key(key_base: str) -> tuple[str, str]:
+    """
+    Desfaz a chave "EXAME (UNIDADE)" montada em process_text_content.
+    "GLICOSE (MG/DL)"                    -> ("GLICOSE", "MG/DL")
+    "HEMACIAS (Hemograma) (MILHÕES/MM3)" -> ("HEMACIAS (Hemograma)", "MILHÕES/MM3")
+    "HOMA IR"                            -> ("HOMA IR", "")
+    """
+    if key_base in TEST_NAMES:
+        return key_base, ""
+    test_name, sep, unit = key_base.rpartition(" (")
+    if sep and unit.endswith(")") and test_name in TEST_NAMES:
+        return test_name, unit[:-1]
+    return key_base, ""
+
+
+def iter_spill(spill_path: str):
+    with open(spill_path, "r", encoding="utf-8") as spill:
+        for line in spill:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def text_value_fields(row: dict) -> set:
+    """Colunas de valor desta linha com resultado textual (não numérico)."""
+    return {k for k, v in row.items() if is_value_field(k) and v != "" and not _is_number(v)}
+
+
+def scan_spill(spill_path: str) -> tuple[set, set]:
+    """(todas as colunas, colunas de valor com algum resultado textual)."""
+    all_fields, text_fields = set(), set()
+    for row in iter_spill(spill_path):
+        all_fields.update(row.keys())
+        text_fields.update(text_value_fields(row))
+    return all_fields, text_fields
+
+
+# ---------- CSV --------------------------------------------------------
+def reconcile_spill(spill_path: str, output_csv_path: str, all_fields=None) -> int:
+    """
+    Converte um spill JSON Lines no CSV final, lendo linha a linha.
+    Sem `all_fields` (ex.: recuperando o spill de um lote que caiu), faz uma
+    passada extra só para descobrir as colunas.
+    O CSV é escrito num .tmp e renomeado, então nunca fica pela metade.
+    Retorna o número de linhas gravadas.
+    """
+    if all_fields is None:
+        all_fields, _ = scan_spill(spill_path)
+    fieldnames = ordered_fieldnames(all_fields)
+
+    tmp_path = output_csv_path + ".tmp"
+    n_rows = 0
+    with open(tmp_path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in iter_spill(spill_path):
+            # Ensure all fields are present in each row, fill missing with empty string
+            writer.writerow({field: row.get(field, "") for field in fieldnames})
+            n_rows += 1
+    os.replace(tmp_path, output_csv_path)
+    return n_rows
+
+
+# ---------- Parquet ----------------------------------------------------
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_text(value):
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def _to_float(value):
+    return float(value) if _is_number(value) else None
+
+
+def _patient_schema_fields() -> list:
+    fields = []
+    for col in PATIENT_COLS:
+        if col in ("idade", "quantidade_exames"):
+            fields.append(pa.field(col, pa.int32()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return fields
+
+
+def _patient_value(col, value):
+    if col in ("idade", "quantidade_exames"):
+        return _to_int(value)
+    return _to_text(value)
+
+
+def _dict_column(values):
+    # Poucos valores distintos repetidos em todas as linhas (status, faixas de
+    # referência, nomes de exame): dictionary-encoded no Arrow e no Parquet.
+    return pa.array(values, type=pa.string()).dictionary_encode()
+
+
+def wide_schema(all_fields, text_fields):
+    fields = _patient_schema_fields()
+    for name in ordered_fieldnames(all_fields)[len(PATIENT_COLS):]:
+        if not is_value_field(name):
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        elif name in text_fields:
+            fields.append(pa.field(name, pa.string()))
+        else:
+            fields.append(pa.field(name, pa.float64()))
+    return pa.schema(fields)
+
+
+def long_schema():
+    return pa.schema(_patient_schema_fields() + [
+        pa.field("exame", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("unidade", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("valor", pa.float64()),
+        pa.field("valor_texto", pa.string()),
+        pa.field("status", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("ref", pa.dictionary(pa.int32(), pa.string())),
+    ])
+
+
+def iter_long_records(row: dict):
+    """Um registro (paciente + exame) por resultado de exame do laudo."""
+    patient = {col: row.get(col) for col in PATIENT_COLS}
+    for key, value in row.items():
+        if not is_value_field(key):
+            continue
+        test_name, unit = split_result_key(key)
+        yield {
+            **patient,
+            "exame": test_name,
+            "unidade": unit,
+            "valor": _to_float(value),
+            "valor_texto": None if _is_number(value) else _to_text(value),
+            "status": row.get(f"{key}_status", ""),
+            "ref": row.get(f"{key}_ref", ""),
+        }
+
+
+def _record_batch(records: list, schema):
+    arrays = []
+    for field in schema:
+        values = [r.get(field.name) for r in records]
+        if field.name in PATIENT_COLS:
+            arrays.append(pa.array([_patient_value(field.name, v) for v in values], type=field.type))
+        elif pa.types.is_dictionary(field.type):
+            # "" é um status válido (dentro da faixa); só ausência vira nulo
+            arrays.append(_dict_column([None if v is None else str(v) for v in values]))
+        elif pa.types.is_floating(field.type):
+            arrays.append(pa.array([_to_float(v) for v in values], type=field.type))
+        else:
+            arrays.append(pa.array([_to_text(v) for v in values], type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def spill_to_parquet(spill_path: str, output_path: str, layout: str = "wide",
+                     all_fields=None, text_fields=None,
+                     batch_rows: int = PARQUET_BATCH_ROWS) -> int:
+    """
+    Converte o spill num Parquet tipado, em row groups de `batch_rows` linhas
+    (memória limitada pelo tamanho do lote, não do arquivo).
+    layout="wide": uma linha por paciente, como o CSV.
+    layout="long": uma linha por (paciente, exame) com valor/unidade/status/ref.
+    Retorna o número de linhas gravadas.
+    """
+    if layout == "wide":
+        if all_fields is None or text_fields is None:
+            all_fields, text_fields = scan_spill(spill_path)
+        schema = wide_schema(all_fields, text_fields)
+        records = iter_spill(spill_path)
+    elif layout == "long":
+        schema = long_schema()
+        records = (rec for row in iter_spill(spill_path) for rec in iter_long_records(row))
+    else:
+        raise ValueError(f"Layout desconhecido: {layout!r} (use 'wide' ou 'long')")
+
+    tmp_path = output_path + ".tmp"
+    n_rows = 0
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_rows:
+                writer.write_batch(_record_batch(batch, schema))
+                n_rows += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(_record_batch(batch, schema))
+            n_rows += len(batch)
+    os.replace(tmp_path, output_path)
+    return n_rows
+
+
+# ---------- writers ----------------------------------------------------
+class _SpillWriter:
+    """
+    Grava os resultados conforme chegam.
+    Só os nomes de colunas ficam em memória (limitados pelo número de exames,
+    não de pacientes). close() converte o spill no arquivo final e o remove.
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.spill_path = output_path + SPILL_SUFFIX
+        self.all_fields = set()
+        self.text_fields = set()
+        self.n_rows = 0
+        self._spill = open(self.spill_path, "w", encoding="utf-8")
+
+    def write(self, row: dict) -> None:
+        self._spill.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._spill.flush()
+        self.all_fields.update(row.keys())
+        self.text_fields.update(text_value_fields(row))
+        self.n_rows += 1
+
+    def _finalize(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> bool:
+        """Gera o arquivo final. Retorna False (e não gera nada) se não houve linhas."""
+        self._spill.close()
+        if not self.n_rows:
+            os.remove(self.spill_path)
+            return False
+        self._finalize()
+        os.remove(self.spill_path)
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Lote interrompido: mantém o spill para reconcile_spill()/spill_to_parquet()
+            self._spill.close()
+        return False
+
+
+class StreamingCsvWriter(_SpillWriter):
+    def __init__(self, output_path: str = "all_lab_results.csv"):
+        super().__init__(output_path)
+
+    def _finalize(self) -> None:
+        reconcile_spill(self.spill_path, self.output_path, self.all_fields)
+
+
+class ParquetResultsWriter(_SpillWriter):
+    def __init__(self, output_path: str = "all_lab_results.parquet", layout: str = "wide"):
+        if pa is None:
+            raise ImportError("Saída Parquet requer pyarrow (pip install pyarrow).")
+        if layout not in ("wide", "long"):
+            raise ValueError(f"Layout desconhecido: {layout!r} (use 'wide' ou 'long')")
+        self.layout = layout
+        super().__init__(output_path)
+
+    def _finalize(self) -> None:
+        spill_to_parquet(
+            self.spill_path, self.output_path, self.layout,
+            all_fields=self.all_fields, text_fields=self.text_fields,
+        )
+
+
+def default_output_path(fmt: str = "csv", layout: str = "wide") -> str:
+    if fmt == "csv":
+        return "all_lab_results.csv"
+    return "all_lab_results.parquet" if layout == "wide" else "all_lab_results_long.parquet"
+
+
+def open_results_writer(output_path: str | None = None, fmt: str = "csv", layout: str = "wide"):
+    """Writer de resultados para o formato pedido ("csv" ou "parquet")."""
+    output_path = output_path or default_output_path(fmt, layout)
+    if fmt == "csv":
+        if layout != "wide":
+            raise ValueError("O CSV só existe no layout 'wide'; use fmt='parquet' para o layout longo.")
+        return StreamingCsvWriter(output_path)
+    if fmt == "parquet":
+        return ParquetResultsWriter(output_path, layout)
+    raise ValueError(f"Formato desconhecido: {fmt!r} (use 'csv' ou 'parquet')")
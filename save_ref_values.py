@@ -1,7 +1,8 @@
 # save_ref_values.py
 import pprint
 from pathlib import Path
-from update_ref_values import UPDATED_REF_VALUES   # lista já gerada
+from update_ref_values import build_updated_ref_values
+from ref_table import write_ref_table
 
 def dump_as_python(var_name: str, data: list, filepath: str = "ref_values_updated.py"):
     with Path(filepath).open("w", encoding="utf-8") as f:
@@ -10,5 +11,9 @@ def dump_as_python(var_name: str, data: list, filepath: str = "ref_values_update
             f.write(f"    ({exam!r}, {pprint.pformat(meta, compact=True)}),\n")
         f.write("]\n")
 
-dump_as_python("REF_VALUES", UPDATED_REF_VALUES)
-print("Arquivo ref_values_updated.py salvo 👍")
+if __name__ == "__main__":
+    UPDATED_REF_VALUES, _ = build_updated_ref_values()   # minera o corpus padrão (ZIP_PATH)
+    dump_as_python("REF_VALUES", UPDATED_REF_VALUES)
+    # Mesmo conteúdo como tabela compilada (ver ref_table), carregável sem importar o literal
+    digest = write_ref_table(UPDATED_REF_VALUES, "ref_table_updated.json", source="ref_values_updated")
+    print(f"Arquivos ref_values_updated.py e ref_table_updated.json (hash {digest[:16]}) salvos 👍")
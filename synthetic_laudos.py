@@ -0,0 +1,269 @@
+import os
+import re
+import random
+import argparse
+
+try:  # Python 3.11+
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+from test_patterns2 import TEST_PATTERNS
+from ref_index import REF_VALUES
+
+# Gerador de laudos sintéticos para benchmark e testes de regressão, sem
+# nenhum dado real de paciente. Cada exame de TEST_PATTERNS vira um trecho de
+# texto gerado a partir da própria regex (o "inverso" da regex: literais,
+# uma opção de cada classe/alternativa, um espaço para \s*, um texto de
+# preenchimento para .*?), com o valor sorteado dentro/fora da faixa de
+# REF_VALUES. Todo trecho é validado contra a regex antes de ser usado.
+
+REF_DICT = {name: info for name, info in REF_VALUES}
+
+SECTION_FILLER = " Material: Soro Coleta em jejum "
+BOILERPLATE = (
+    "Liberado eletronicamente em 01/01/2024 Assinatura digital do laudo "
+    "Método analítico validado conforme RDC vigente Resp. Técnico CRM 0000 "
+)
+FIRST_NAMES = ["ANA", "BRUNO", "CARLA", "DIEGO", "ELISA", "FABIO", "GISELE", "IGOR", "JULIA", "LUIZ"]
+LAST_NAMES = ["ALMEIDA", "BARROS", "CASTRO", "DUARTE", "FONSECA", "GOMES", "MOURA", "PEREIRA", "TEIXEIRA"]
+PAGE_CHARS = 3500  # cabe numa página A4 em fonte 8
+
+
+# ---------- regex -> texto ---------------------------------------------
+def _char_for_set(items) -> str:
+    """Um caractere que satisfaz a classe [...]."""
+    negate = False
+    for op, av in items:
+        if op is sre_constants.NEGATE:
+            negate = True
+        elif negate:
+            continue
+        elif op is sre_constants.LITERAL:
+            return chr(av)
+        elif op is sre_constants.RANGE:
+            return chr(av[0])
+        elif op is sre_constants.CATEGORY:
+            if av is sre_constants.CATEGORY_DIGIT:
+                return "1"
+            if av is sre_constants.CATEGORY_SPACE:
+                return " "
+            return "a"
+    return "x"  # classe negada: qualquer coisa fora dela
+
+
+def _render(parsed, rng, overrides) -> str:
+    out = []
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            out.append(chr(av))
+        elif op is sre_constants.NOT_LITERAL:
+            out.append("x" if chr(av) != "x" else "y")
+        elif op is sre_constants.ANY:
+            out.append("x")
+        elif op is sre_constants.IN:
+            out.append(_char_for_set(av))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            lo, hi, sub = av
+            if lo == 0 and len(sub) == 1 and sub[0][0] is sre_constants.ANY:
+                out.append(SECTION_FILLER)  # ".*?" entre o título e o RESULTADO
+                continue
+            # Repetições: o mínimo, mas ao menos uma (\s* vira um espaço)
+            out.append(_render(sub, rng, overrides) * min(max(lo, 1), hi))
+        elif op is sre_constants.SUBPATTERN:
+            group, _, _, sub = av
+            if group in overrides:
+                out.append(overrides[group])
+            else:
+                out.append(_render(sub, rng, overrides))
+        elif op is sre_constants.BRANCH:
+            _, alternatives = av
+            out.append(_render(alternatives[0], rng, overrides))
+        # AT (\b, ^, $) e afins não geram texto
+    return "".join(out)
+
+
+def _format_number(value: float) -> str:
+    return f"{value:.1f}".replace(".", ",")
+
+
+def _pick_value(test_name: str, rng: random.Random, abnormal_rate: float) -> str | None:
+    """Valor plausível segundo REF_VALUES (às vezes fora da faixa), ou None."""
+    ref_info = REF_DICT.get(test_name)
+    if not ref_info or not ref_info.get("references"):
+        return None
+    ref = ref_info["references"][-1]  # em geral a condição "Geral"
+    if ref.get("type", "range") == "qualitative":
+        expected = ref.get("expected")
+        exp_list = expected if isinstance(expected, list) else [expected]
+        return rng.choice(exp_list) if exp_list and exp_list[0] else None
+    lo, hi = ref.get("min"), ref.get("max")
+    if lo is None and hi is None:
+        return None
+    lo = hi / 2 if lo is None else lo
+    hi = lo * 2 if hi is None else hi
+    if rng.random() < abnormal_rate:
+        value = rng.choice([lo * 0.7, hi * 1.3])
+    else:
+        value = rng.uniform(lo, hi)
+    return _format_number(max(value, 0.1))
+
+
+def sample_for_pattern(test_name, pattern_str, group_map, rng, abnormal_rate=0.2):
+    """
+    (trecho, valor esperado) que a regex do exame reconhece, ou None se não
+    for possível gerar um trecho válido.
+    """
+    flags = re.IGNORECASE | re.DOTALL
+    parsed = sre_parse.parse(pattern_str, flags)
+    regex = re.compile(pattern_str, flags)
+    value_group = group_map["value_group"]
+
+    candidates = []
+    value = _pick_value(test_name, rng, abnormal_rate)
+    if value is not None:
+        candidates.append({value_group: value})
+    candidates.append({})  # valor gerado pela própria regex
+    for overrides in candidates:
+        snippet = _render(parsed, rng, overrides)
+        m = regex.search(snippet)
+        if m and m.start() == 0:
+            return snippet, m.group(value_group).strip()
+    return None
+
+
+def _build_samplers():
+    samplers = {}
+    probe = random.Random(0)
+    for test_name, (pattern_str, group_map) in TEST_PATTERNS:
+        if test_name in samplers:
+            continue  # padrão alternativo do mesmo exame
+        if sample_for_pattern(test_name, pattern_str, group_map, probe) is not None:
+            samplers[test_name] = (pattern_str, group_map)
+    return samplers
+
+
+SAMPLERS = _build_samplers()
+SUPPORTED_TESTS = list(SAMPLERS)
+
+
+# ---------- laudo ------------------------------------------------------
+def make_patient(rng: random.Random, **fields) -> dict:
+    """Paciente fictício; qualquer campo pode ser fixado via `fields`."""
+    nome = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+    patient = {
+        "nome": nome,
+        "rg": str(rng.randint(1000000, 9999999)),
+        "codigo_os": f"{rng.randint(1000, 9999)}-{rng.randint(1, 9)}",
+        "data_nascimento": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1940, 2015)}",
+        "sexo": rng.choice(["M", "F"]),
+        "cpf": f"{rng.randint(0, 999):03d}.{rng.randint(0, 999):03d}.{rng.randint(0, 999):03d}-{rng.randint(0, 99):02d}",
+        "medico": f"DR {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "atendimento": "01/01/2024",
+        "convenio": "UNIMED",
+    }
+    patient.update(fields)
+    return patient
+
+
+def patient_header(patient: dict, n_exames: int) -> str:
+    return (
+        f"Nome : {patient['nome']} RG : {patient['rg']} Código da OS : {patient['codigo_os']} "
+        f"DN : {patient['data_nascimento']} CPF : {patient['cpf']} Médico : {patient['medico']} "
+        f"Atendimento : {patient['atendimento']} Convênio: {patient['convenio']} "
+        f"Qnt de exames: {n_exames} "
+    )
+
+
+def make_laudo(rng: random.Random, tests=None, n_tests: int = 20, pages: int = 1,
+               abnormal_rate: float = 0.2, patient: dict | None = None, boilerplate: bool = True) -> dict:
+    """
+    Um laudo sintético.
+    tests: nomes de exames (mix fixo); sem ele, sorteia `n_tests` exames.
+    pages: número mínimo de páginas (completa com páginas de assinatura).
+    boilerplate: False = exames colados, sem texto entre o valor de um e o
+    título do seguinte.
+    Retorna {"patient", "pages" (lista de textos), "text", "expected" (exame -> valor)}.
+    """
+    patient = patient or make_patient(rng)
+    if tests is None:
+        tests = rng.sample(SUPPORTED_TESTS, min(n_tests, len(SUPPORTED_TESTS)))
+
+    sections, expected = [], {}
+    for test_name in tests:
+        pattern_str, group_map = SAMPLERS[test_name]
+        snippet, value = sample_for_pattern(test_name, pattern_str, group_map, rng, abnormal_rate)
+        sections.append(snippet + " " + BOILERPLATE if boilerplate else snippet + " ")
+        expected[test_name] = value
+
+    header = patient_header(patient, len(tests))
+    page_texts, current = [], header
+    for section in sections:
+        if len(current) + len(section) > PAGE_CHARS and current != header:
+            page_texts.append(current)
+            current = header
+        current += section
+    page_texts.append(current)
+    while len(page_texts) < pages:
+        page_texts.append(header + BOILERPLATE * 8)
+
+    return {
+        "patient": patient,
+        "pages": page_texts,
+        # Mesmo formato do texto extraído do PDF: uma linha por página
+        "text": "".join(" ".join(page.split()) + "\n" for page in page_texts),
+        "expected": expected,
+    }
+
+
+def write_pdf(laudo: dict, path: str) -> None:
+    import fitz  # só necessário para gerar PDFs
+
+    doc = fitz.open()
+    for page_text in laudo["pages"]:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(36, 36, page.rect.width - 36, page.rect.height - 36),
+                            page_text, fontsize=8, fontname="helv")
+    doc.save(path)
+    doc.close()
+
+
+def write_corpus(directory: str, n_docs: int, pdf: bool = False, seed: int = 0, **laudo_kwargs) -> list:
+    """Grava `n_docs` laudos (.txt ou .pdf) em `directory`. Retorna [(caminho, laudo)]."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    written = []
+    for i in range(n_docs):
+        laudo = make_laudo(rng, **laudo_kwargs)
+        path = os.path.join(directory, f"laudo_{i:06d}.{'pdf' if pdf else 'txt'}")
+        if pdf:
+            write_pdf(laudo, path)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(laudo["text"])
+        written.append((path, laudo))
+    return written
+
+
+# ---------- main -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Gera laudos sintéticos (sem dados reais).")
+    parser.add_argument("pasta")
+    parser.add_argument("-n", "--docs", type=int, default=100)
+    parser.add_argument("--tests-per-doc", type=int, default=20)
+    parser.add_argument("--tests", default=None, help="Mix fixo de exames, separados por ';'.")
+    parser.add_argument("--pages", type=int, default=1, help="Mínimo de páginas por laudo.")
+    parser.add_argument("--pdf", action="store_true", help="Gera PDFs em vez de TXT.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tests = args.tests.split(";") if args.tests else None
+    write_corpus(args.pasta, args.docs, pdf=args.pdf, seed=args.seed,
+                 tests=tests, n_tests=args.tests_per_doc, pages=args.pages)
+    print(f"✅ {args.docs} laudo(s) em {args.pasta} ({len(SUPPORTED_TESTS)} exames suportados)")
+
+
+if __name__ == "__main__":
+    main()
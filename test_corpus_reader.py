@@ -0,0 +1,49 @@
+import random
+import zipfile
+
+from corpus_reader import iter_members, map_members, read_member_bytes
+from packed_corpus import pack_directory
+from synthetic_laudos import make_laudo
+
+# Leitura serial seguida de leitura paralela no mesmo processo: os filhos do
+# pool não podem reaproveitar o ZipFile/mmap que o pai deixou aberto.
+
+N_LAUDOS = 30
+
+
+def _laudos():
+    rng = random.Random(0)
+    return [(f"laudo_{i:02d}.txt", make_laudo(rng, n_tests=60)["text"] * 5) for i in range(N_LAUDOS)]
+
+
+def _serial_then_parallel(corpus_path):
+    members = list(iter_members(corpus_path))
+    serial = [read_member_bytes(m) for m in members]
+    parallel = list(map_members(read_member_bytes, members, workers=4, chunksize=1))
+    return serial, parallel
+
+
+def test_zip_serial_then_parallel(tmp_path):
+    laudos = _laudos()
+    zip_path = tmp_path / "corpus.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, text in laudos:
+            zf.writestr(name, text)
+
+    serial, parallel = _serial_then_parallel(str(zip_path))
+    assert serial == [text.encode("utf-8") for _, text in laudos]
+    assert parallel == serial
+
+
+def test_packed_serial_then_parallel(tmp_path):
+    laudos = _laudos()
+    folder = tmp_path / "laudos"
+    folder.mkdir()
+    for name, text in laudos:
+        (folder / name).write_text(text, encoding="utf-8")
+    pack_path = str(tmp_path / "corpus.pack")
+    pack_directory(str(folder), pack_path)
+
+    serial, parallel = _serial_then_parallel(pack_path)
+    assert len(serial) == N_LAUDOS
+    assert parallel == serial
@@ -0,0 +1,38 @@
+import zipfile
+
+import pytest
+
+from update_ref_values import clean_ranges, mine_ranges, range_report
+
+# O minerador lê como o original: linhas de str.splitlines() (a quebra de
+# página \x0c do PDF separa linhas) e o ZIP na ordem do arquivo, que decide
+# empates entre faixas igualmente comuns.
+
+
+def _write_zip(path, members):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, text in members:
+            zf.writestr(name, text)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_form_feed_splits_lines(tmp_path, workers):
+    corpus = tmp_path / "corpus.zip"
+    _write_zip(corpus, [("laudo.txt", "GLICOSE  70 a 99 mg/dL\x0cUREIA  15 a 40 mg/dL\n")])
+
+    ranges = clean_ranges(range_report(mine_ranges(corpus, workers=workers, chunksize=1)))
+    assert ranges["GLICOSE"] == {"ref_min": 70.0, "ref_max": 99.0, "unit": "mg/dL"}
+    assert ranges["UREIA"] == {"ref_min": 15.0, "ref_max": 40.0, "unit": "mg/dL"}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_ties_follow_archive_order(tmp_path, workers):
+    corpus = tmp_path / "corpus.zip"
+    # Fora da ordem alfabética de propósito: vale a faixa do primeiro membro do arquivo
+    _write_zip(corpus, [
+        ("b.txt", "GLICOSE  70 a 99 mg/dL\n"),
+        ("a.txt", "GLICOSE  60 a 110 mg/dL\n"),
+    ])
+
+    ranges = clean_ranges(range_report(mine_ranges(corpus, workers=workers, chunksize=1)))
+    assert ranges["GLICOSE"] == {"ref_min": 70.0, "ref_max": 99.0, "unit": "mg/dL"}
@@ -2,16 +2,34 @@ import os
 import re
 import csv
 import json
+import argparse
 import fitz
+from functools import partial
 from datetime import datetime
 
 # Import your new pattern and reference value files
 from test_patterns2 import TEST_PATTERNS
-from ref_values_updated2 import REF_VALUES
+from pattern_engine import contains_anchor, iter_test_matches
+from result_writers import open_results_writer
+from ref_index import classify_value, lookup_reference
+from extraction_cache import (
+    DEFAULT_CACHE_PATH, content_digest, file_digest, get_cache, prune_stale_results, rules_version,
+)
+from corpus_reader import corpus_kind, decode_text, iter_members, map_members, read_member_bytes, read_member_text
 
 # ---------- utilidades -------------------------------------------------
-# Convert REF_VALUES list of tuples to a dictionary for easier lookup
-REF_DICT = {name: info for name, info in REF_VALUES}
+# Versões usadas como chave do cache de extração (extraction_cache):
+# incrementar PARSER_VERSION ao mudar process_text_content/check_reference e
+# TEXT_VARIANTS ao mudar a forma como o texto sai do PDF (PAGE_FILTER_VERSION
+# ao mudar a seleção de páginas dos modos "content"/"anchors").
+PARSER_VERSION = "3"
+TEXT_VARIANTS = {"words": "words-v1", "lines": "lines-v1"}
+PAGE_FILTER_VERSION = "2"
+
+def text_variant(pages: str = "all", backend: str = "words") -> str:
+    """Variante do texto no cache: cada backend/modo de páginas gera um texto diferente."""
+    variant = TEXT_VARIANTS[backend]
+    return variant if pages == "all" else f"{variant}/{pages}-v{PAGE_FILTER_VERSION}"
 
 def normalize_number(txt: str) -> float | str:
     """Troca vírgula por ponto, remove separador de milhar e tenta float."""
@@ -38,186 +56,115 @@ def parse_age_from_text(dob_text: str) -> int | None:
     # For now, we'll only extract if explicitly stated like "(7 anos)".
     return None
 
+def age_from_birth_date(data_nascimento_raw: str, today: datetime | None = None) -> int:
+    """Idade em anos completos na data de hoje, a partir de "dd/mm/aaaa"."""
+    dob = datetime.strptime(data_nascimento_raw, "%d/%m/%Y")
+    today = today or datetime.today()
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
 def check_reference(test_name: str, value, patient_age: int | None, patient_gender: str | None):
     """
     Compares the test value against relevant reference ranges based on patient context.
     Returns (status, ref_str)
       • status: "", "↓", "↑" (quantitativo)  or "OK", "≠" (qualitativo) or "?" (error/no-match)
       • ref_str: legible string of the expected range/value(s)
+    The reference for each (test, gender, age bucket) is chosen once at import
+    time (see ref_index), so this is a lookup plus a comparison.
     """
-    ref_info = REF_DICT.get(test_name)
-    if not ref_info:
+    entry = lookup_reference(test_name, patient_age, patient_gender)
+    if entry is None:
         return "?", "Referência não encontrada"
-
-    # Filter applicable references based on patient_age and patient_gender
-    # Prioritize more specific conditions using the 'priority' field
-    applicable_refs = []
-    for ref_condition in ref_info.get("references", []):
-        condition_met = True
-        
-        # Check gender condition
-        if ref_condition.get("gender") and patient_gender:
-            if ref_condition["gender"].upper() != patient_gender.upper():
-                condition_met = False
-        
-        # Check age condition (if patient age is available)
-        if patient_age is not None:
-            age_min = ref_condition.get("age_min")
-            age_max = ref_condition.get("age_max")
-            
-            if age_min is not None and patient_age < age_min:
-                condition_met = False
-            if age_max is not None and patient_age > age_max: # age_max is inclusive
-                condition_met = False
-        
-        # If no specific age/gender criteria, or if patient_age/gender is None,
-        # consider "Geral" conditions or those without specific age/gender requirements.
-        # This part needs careful balancing of priorities.
-        if condition_met:
-            applicable_refs.append(ref_condition)
-    
-    # Sort by priority (descending), so higher priority references are checked first
-    applicable_refs.sort(key=lambda r: r.get("priority", 0), reverse=True)
-
-    chosen_ref = None
-    if applicable_refs:
-        # Pick the highest priority applicable reference.
-        # If multiple have the same highest priority, the first one encountered (due to sort stability) is chosen.
-        chosen_ref = applicable_refs[0]
-    else:
-        # Fallback to a general reference if no specific condition matched, by looking for a "Geral" condition
-        for ref_condition in ref_info.get("references", []):
-            if ref_condition.get("condition", "").lower() == "geral" or \
-               (ref_condition.get("gender") is None and ref_condition.get("age_min") is None):
-                chosen_ref = ref_condition
-                break
-        
-        # If still no chosen_ref, use the very first one as a last resort, or indicate no reference found
-        if not chosen_ref and ref_info.get("references"):
-            chosen_ref = ref_info["references"][0] # Just pick the first available if nothing specific/general matches
-
-    if not chosen_ref:
-        return "?", "Referência não aplicável/encontrada para idade/gênero"
-
-    ref_str = chosen_ref.get("condition", "") + ": "
-    status = ""
-    ref_type = chosen_ref.get("type", "range") # Default to "range"
-
-    # --- Quantitative Comparisons ----
-    if ref_type == "range":
-        ref_min = chosen_ref.get("min")
-        ref_max = chosen_ref.get("max")
-        if ref_min is not None and ref_max is not None:
-            ref_str += f"{ref_min}-{ref_max} {ref_info.get('unit','')}".strip()
-            try:
-                num = float(value)
-                if num < ref_min:
-                    status = "↓"
-                elif num > ref_max:
-                    status = "↑"
-                else:
-                    status = ""  # Within range
-            except ValueError:
-                status = "?"  # Not numeric where it should be
-        else:
-            status = "?" # Invalid range definition
-            ref_str += "Intervalo inválido"
-    elif ref_type == "min_inclusive":
-        ref_min = chosen_ref.get("min")
-        if ref_min is not None:
-            ref_str += f">={ref_min} {ref_info.get('unit','')}".strip()
-            try:
-                num = float(value)
-                if num < ref_min:
-                    status = "↓"
-                else:
-                    status = ""
-            except ValueError:
-                status = "?"
-        else:
-            status = "?"
-            ref_str += "Mínimo inválido"
-    elif ref_type == "max_inclusive":
-        ref_max = chosen_ref.get("max")
-        if ref_max is not None:
-            ref_str += f"<={ref_max} {ref_info.get('unit','')}".strip()
-            try:
-                num = float(value)
-                if num > ref_max:
-                    status = "↑"
-                else:
-                    status = ""
-            except ValueError:
-                status = "?"
-        else:
-            status = "?"
-            ref_str += "Máximo inválido"
-    elif ref_type == "range_inclusive_lower_bound": # For ranges like "< 0.10 a 0.40"
-        ref_min = chosen_ref.get("min")
-        ref_max = chosen_ref.get("max")
-        if ref_min is not None and ref_max is not None:
-            ref_str += f"<{ref_min} a {ref_max} {ref_info.get('unit','')}".strip() # Displaying the "<" part
-            try:
-                num = float(value)
-                if num < ref_min: # If value is explicitly smaller than the lowest bound
-                    status = "↓"
-                elif num > ref_max:
-                    status = "↑"
-                else:
-                    status = "" # Within range (or within lower-bound-inclusive range)
-            except ValueError:
-                status = "?"
-        else:
-            status = "?"
-            ref_str += "Intervalo inválido"
-    # --- Qualitative Comparisons -----
-    elif ref_type == "qualitative":
-        expected = chosen_ref.get("expected")
-        if expected:
-            exp_list = expected if isinstance(expected, list) else [expected]
-            ref_str += ", ".join(exp_list)
-            if str(value).strip().upper() in [e.upper() for e in exp_list]:
-                status = "OK"
-            else:
-                status = "≠"
-        else:
-            status = "?"
-            ref_str += "Valores esperados não definidos"
-            
-    # For qualitative, if it's "OK" and there was only one expected value, show "OK".
-    # Otherwise, for multiple expected values or if it's "≠", just show the inequality/status.
-    if ref_type == "qualitative":
-        if status == "OK" and len(chosen_ref.get("expected", [])) == 1:
-            pass # Keep "OK"
-        elif status == "OK": # Multiple expected values and result is one of them
-            status = "" # No special arrow, just means it's acceptable
-        
-    return status, ref_str
+    return classify_value(entry, value)
 
 
 # ---------- extração ---------------------------------------------------
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        # Using "text" mode instead of "words" might preserve some layout, but "words" is often better for flow.
-        # Given your TXT files are already flattened, sticking with "words" joining.
-        words = page.get_text("words", sort=True)
-        text += " ".join(word[4] for word in words) + "\n" # Add newline at end of each page text
-    return text
-
-
-def process_text_content(text: str):
+PAGE_MODES = ("all", "content", "anchors")
+RESULT_WORD = re.compile(r"\bRESULTADO\b")  # maiúsculo: o "resultados" do texto corrido não conta
+
+def _keep_page(page, textpage, page_index: int, pages: str) -> bool:
+    """
+    Decide, pelo texto bruto da página (sem ordenar palavras), se ela entra:
+      • "content": descarta páginas só de cabeçalho, assinatura ou descrição
+        de método — sem nenhum "RESULTADO" e sem âncora de exame;
+      • "anchors": só páginas com o nome de algum exame (ver contains_anchor).
+    A primeira página sempre entra (dados do paciente).
+    """
+    if page_index == 0:
+        return True
+    raw = page.get_text("text", textpage=textpage)
+    if pages == "content" and RESULT_WORD.search(raw):
+        return True
+    return contains_anchor(raw)
+
+
+def _page_text_words(page, textpage) -> str:
+    # Using "text" mode instead of "words" might preserve some layout, but "words" is often better for flow.
+    # Given your TXT files are already flattened, sticking with "words" joining.
+    words = page.get_text("words", sort=True, textpage=textpage)
+    return " ".join(word[4] for word in words)
+
+
+def _page_text_lines(page, textpage) -> str:
+    """
+    Reflow por linha: pega as linhas prontas do PyMuPDF ("dict") e ordena só
+    as linhas — algumas dezenas por página — pela mesma chave que o sort=True
+    usa nas palavras (base y1, depois x0). Nos laudos do laboratório cada
+    linha tem uma única base, então a ordem bate com a do backend "words"
+    sem pagar o sort de milhares de palavras.
+    """
+    lines = []
+    for block in page.get_text("dict", textpage=textpage)["blocks"]:
+        for line in block.get("lines", ()):  # blocos de imagem não têm linhas
+            text = " ".join("".join(span["text"] for span in line["spans"]).split())
+            if text:
+                x0, _, _, y1 = line["bbox"]
+                lines.append((y1, x0, text))
+    lines.sort(key=lambda line: (line[0], line[1]))
+    return " ".join(text for _, _, text in lines)
+
+
+TEXT_BACKENDS = {"words": _page_text_words, "lines": _page_text_lines}
+
+
+def extract_text_from_pdf(pdf_path, pages: str = "all", backend: str = "words", data: bytes | None = None):
+    """
+    Texto do PDF, uma linha por página (palavras na ordem de leitura).
+    pages="all" extrai todas as páginas; "content"/"anchors" pulam páginas sem
+    resultado antes da etapa cara (ordenar e juntar as palavras), ver _keep_page.
+    backend="words" (padrão) ordena palavra a palavra; "lines" reflui linhas
+    inteiras (mais barato; validar com compare_backends.py).
+    `data`: conteúdo do PDF já lido (o arquivo não é reaberto).
+    """
+    if pages not in PAGE_MODES:
+        raise ValueError(f"Modo de páginas desconhecido: {pages!r} (use {', '.join(PAGE_MODES)})")
+    if backend not in TEXT_BACKENDS:
+        raise ValueError(f"Backend de texto desconhecido: {backend!r} (use {', '.join(TEXT_BACKENDS)})")
+    page_text = TEXT_BACKENDS[backend]
+    parts = []
+    with (fitz.open(pdf_path) if data is None else fitz.open(stream=data, filetype="pdf")) as doc:
+        for page_index, page in enumerate(doc):
+            textpage = page.get_textpage()
+            if pages != "all" and not _keep_page(page, textpage, page_index, pages):
+                continue
+            parts.append(page_text(page, textpage))
+    # Buffers das páginas juntados uma vez só (+= repetido é quadrático em laudos longos)
+    return "".join(part + "\n" for part in parts) # Add newline at end of each page text
+
+
+# This regex is made more robust to handle potential missing RG or variable spacing.
+PACIENTE_REGEX = re.compile(
+    r"Nome\s*:\s*(.*?)\s*(?:RG\s*:\s*(.*?)\s*)?Código da OS\s*:\s*(.*?)\s*DN\s*:\s*(.*?)\s*CPF\s*:\s*(.*?)\s*Médico\s*:\s*(.*?)\s*Atendimento\s*:\s*(.*?)\s*Convênio:\s*(.*?)\s*Qnt de exames:\s*(\d+)",
+    re.DOTALL, # DOTALL to match across lines if needed, though typically patient info is concise.
+)
+
+def process_text_content(text: str, profiler=None):
     """
     Extrai info do paciente + resultados laboratoriais + status vs referência.
+    profiler: opcional (pattern_profile.PatternProfiler), registra o custo de
+    cada regex de exame neste laudo.
     """
     # -------- paciente -----------
-    # This regex is made more robust to handle potential missing RG or variable spacing.
-    paciente_pattern = re.search(
-        r"Nome\s*:\s*(.*?)\s*(?:RG\s*:\s*(.*?)\s*)?Código da OS\s*:\s*(.*?)\s*DN\s*:\s*(.*?)\s*CPF\s*:\s*(.*?)\s*Médico\s*:\s*(.*?)\s*Atendimento\s*:\s*(.*?)\s*Convênio:\s*(.*?)\s*Qnt de exames:\s*(\d+)",
-        text,
-        re.DOTALL, # DOTALL to match across lines if needed, though typically patient info is concise.
-    )
+    paciente_pattern = PACIENTE_REGEX.search(text)
     if not paciente_pattern:
         print("⚠️ Dados do paciente não encontrados!")
         return None
@@ -225,12 +172,8 @@ def process_text_content(text: str):
     data_nascimento_raw = paciente_pattern.group(4).strip()
     patient_age = parse_age_from_text(data_nascimento_raw)
     print(data_nascimento_raw)
-    from datetime import datetime
 
-    dob = datetime.strptime(data_nascimento_raw, "%d/%m/%Y")
-    today = datetime.today()
-
-    age_years = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+    age_years = age_from_birth_date(data_nascimento_raw)
     print(f"{age_years}")
 
     women = [
@@ -301,11 +244,8 @@ def process_text_content(text: str):
     # -------- resultados ----------
     lab_results = {}
 
-    for test_name, (pattern_str, group_map) in TEST_PATTERNS:
-        match = re.search(pattern_str, text, re.IGNORECASE | re.DOTALL)
-        if not match:
-            continue
-
+    # Padrões pré-compilados; cada regex só roda a partir da âncora da sua seção
+    for test_name, match, group_map in iter_test_matches(text, profiler):
         value_raw = match.group(group_map["value_group"]).strip()
         
         unit = ""
@@ -336,71 +276,238 @@ def process_text_content(text: str):
 
 
 # ---------- diretório --------------------------------------------------
-def process_directory(directory_path):
-    all_rows = []
-    all_fields = set()
-
-    for fname in os.listdir(directory_path):
-        if not fname.lower().endswith((".pdf", ".txt")): # Also process .txt files if they are already extracted
-            continue
-        pdf_path = os.path.join(directory_path, fname)
-        print(f"📄 Processando: {fname}")
-        
-        # Read content from .txt files directly, or extract from .pdf
-        if fname.lower().endswith(".txt"):
-            with open(pdf_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        else: # .pdf
-            content = extract_text_from_pdf(pdf_path)
-
-        resultado = process_text_content(content)
-        if resultado:
-            all_rows.append(resultado)
-            all_fields.update(resultado.keys())
-
-    if not all_rows:
-        print("❌ Nenhum resultado encontrado.")
-        return
-
-    # ----- campos em ordem -----
-    patient_cols = [
-        "nome",
-        "codigo_os",
-        "data_nascimento",
-        "idade", # New field
-        "sexo",    # New field
-        "cpf",
-        "medico",
-        "atendimento",
-        "convenio",
-        "quantidade_exames",
+def list_input_files(directory_path):
+    """PDFs e TXTs da pasta, em ordem alfabética (ordem determinística do lote)."""
+    return [
+        os.path.join(directory_path, fname)
+        for fname in sorted(os.listdir(directory_path))
+        if fname.lower().endswith((".pdf", ".txt")) # Also process .txt files if they are already extracted
     ]
-    # Ensure patient_cols are at the beginning, then sort other unique lab result keys
-    other_cols = sorted(c for c in all_fields if c not in patient_cols)
-    fieldnames = patient_cols + other_cols
 
-    # ----- grava CSV -------------
-    output_csv_path = "all_lab_results.csv"
-    with open(output_csv_path, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in all_rows:
-            # Ensure all fields are present in each row, fill missing with empty string
-            writer.writerow({field: row.get(field, "") for field in fieldnames})
 
-    print(f"✅ CSV gerado: {output_csv_path}")
+def read_text_content(path, pages="all", backend="words"):
+    """Texto do laudo: .txt é lido direto, .pdf passa pelo PyMuPDF."""
+    # Read content from .txt files directly, or extract from .pdf
+    if path.lower().endswith(".txt"):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return extract_text_from_pdf(path, pages, backend)
+
+
+def process_file(path, cache_path=None, pages="all", backend="words"):
+    """
+    Lê um laudo (.txt já extraído ou .pdf) e devolve o dict do paciente ou None.
+    Com `cache_path`, consulta o cache de extração pelo hash do conteúdo:
+    arquivos já vistos com as mesmas regras não são reabertos nem reprocessados.
+    """
+    if cache_path is None:
+        return process_text_content(read_text_content(path, pages, backend))
+    return _process_cached(
+        file_digest(path), path, lambda: read_text_content(path, pages, backend), cache_path, pages, backend,
+    )
+
+
+def _process_cached(digest, name, read_text, cache_path, pages, backend):
+    """Resultado do laudo de hash `digest` pelo cache; `read_text()` só roda se faltar o texto."""
+    cache = get_cache(cache_path)
+    is_pdf = not name.lower().endswith(".txt")
+    variant = text_variant(pages, backend)
+    # O resultado depende do texto: de um PDF, cada backend/modo de páginas
+    # tem o seu (um run "anchors" não pode servir um run "all")
+    rules = rules_version(PARSER_VERSION)
+    if is_pdf:
+        rules = f"{rules}/{variant}"
+
+    hit, resultado = cache.get_result(digest, rules)
+    # A idade (e com ela a faixa de referência) muda no aniversário do
+    # paciente; nesse caso o resultado é refeito a partir do texto cacheado.
+    if hit and (resultado is None or resultado.get("idade") == age_from_birth_date(resultado["data_nascimento"])):
+        return resultado
+
+    content = cache.get_text(digest, variant) if is_pdf else None
+    if content is None:
+        content = read_text()
+        if is_pdf:
+            cache.put_text(digest, variant, content)
+
+    resultado = process_text_content(content)
+    cache.put_result(digest, rules, resultado)
+    return resultado
+
+
+def _process_file_safe(path, cache_path=None, pages="all", backend="words"):
+    """
+    Roda process_file isolando falhas: um laudo quebrado (PDF corrompido,
+    DN fora do formato, paciente sem sexo cadastrado...) não derruba o lote.
+    Retorna (path, resultado, erro).
+    """
+    try:
+        return path, process_file(path, cache_path, pages, backend), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def process_member(member, cache_path=None, pages="all", backend="words"):
+    """
+    process_file para um membro de corpus (corpus_reader): arquivo da pasta,
+    laudo dentro de ZIP/tar ou do corpus empacotado. Fora da pasta o laudo é
+    lido uma vez só para a memória, e o hash (cache) sai desses mesmos bytes.
+    """
+    if member.kind == "dir":
+        return process_file(member.key, cache_path, pages, backend)
+    is_txt = member.name.lower().endswith(".txt")
+    if cache_path is None:
+        if is_txt:
+            return process_text_content(read_member_text(member))
+        return process_text_content(extract_text_from_pdf(member.name, pages, backend, data=read_member_bytes(member)))
+
+    data = read_member_bytes(member)
+
+    def read_text():
+        if is_txt:
+            return decode_text(data)
+        return extract_text_from_pdf(member.name, pages, backend, data=data)
+
+    return _process_cached(content_digest(data), member.name, read_text, cache_path, pages, backend)
+
+
+def _process_member_safe(member, cache_path=None, pages="all", backend="words"):
+    """_process_file_safe para um membro de corpus. Retorna (nome, resultado, erro)."""
+    try:
+        return member.name, process_member(member, cache_path, pages, backend), None
+    except Exception as e:
+        return member.name, None, f"{type(e).__name__}: {e}"
+
+
+def iter_corpus_results(members, workers=1, cache_path=None, pages="all", backend="words", chunksize=16):
+    """
+    Gera (nome, resultado, erro) para membros de corpus (ver
+    corpus_reader.iter_members), na ordem de `members`, consumindo-os aos
+    poucos. workers > 1 distribui leitura + regex num pool de processos
+    (CPU-bound, preso ao GIL); os processos recebem só a referência do
+    laudo (caminho, nome no ZIP, posição no .pack) e o leem por conta própria.
+    """
+    yield from map_members(
+        partial(_process_member_safe, cache_path=cache_path, pages=pages, backend=backend),
+        members, workers=workers, chunksize=chunksize,
+    )
+
+
+def prune_cache(cache_path: str) -> int:
+    """Apaga do cache os resultados de versões de regras que não são a atual."""
+    n = prune_stale_results(cache_path, rules_version(PARSER_VERSION))
+    if n:
+        print(f"🗑️ {n} resultado(s) de regras antigas removido(s) do cache")
+    return n
+
+
+def process_directory(directory_path, workers=1, output_path=None, fmt="csv", layout="wide",
+                      cache_path=None, pages="all", backend="words", pipeline="pool", prefetch=8):
+    """
+    Extrai todos os laudos da pasta e grava o resultado em streaming: cada
+    paciente vai para o spill em disco assim que é processado (ver
+    result_writers). fmt="csv" gera o CSV largo de sempre; fmt="parquet" gera
+    Parquet tipado, no layout "wide" (um paciente por linha) ou "long"
+    (uma linha por paciente × exame).
+    `cache_path` ativa o cache de extração por hash de conteúdo (resultados de
+    regras antigas são apagados dele no início do run); `pages`
+    escolhe quais páginas dos PDFs são extraídas e `backend` como o texto
+    sai de cada página (ver extract_text_from_pdf).
+    pipeline="async" sobrepõe leitura do disco, extração do PDF e regex em
+    estágios com filas limitadas (ver async_pipeline; lê `prefetch` arquivos
+    à frente); não usa o cache de extração.
+    `directory_path` também pode ser um ZIP, um tar (comprimido ou não) ou um
+    corpus TXT empacotado (.pack, ver packed_corpus): os laudos são lidos de
+    dentro do arquivo, sob demanda (ver corpus_reader).
+    """
+    if pipeline == "async" and cache_path:
+        raise ValueError("O cache de extração não é usado com pipeline='async'.")
+    if cache_path:
+        prune_cache(cache_path)
+    kind = corpus_kind(directory_path)
+    members = iter_members(directory_path)
+    failed = []
+
+    with open_results_writer(output_path, fmt, layout) as writer:
+        def handle(path, resultado, erro):
+            fname = os.path.basename(path)
+            if erro:
+                print(f"❌ Falha em {fname}: {erro}")
+                failed.append(fname)
+                return
+            print(f"📄 Processado: {fname}")
+            if resultado:
+                writer.write(resultado)
+
+        if pipeline == "async":
+            from async_pipeline import run_pipeline  # importa unimed: só aqui para não criar ciclo
+            metrics = run_pipeline(members, handle, workers, pages, backend, prefetch=prefetch)
+            print("\n".join(metrics.report()))
+        else:
+            # TXT do corpus empacotado são baratos: lotes maiores que no caso dos PDFs
+            chunksize = 256 if kind == "packed" else 16
+            for name, resultado, erro in iter_corpus_results(members, workers, cache_path, pages, backend, chunksize):
+                handle(name, resultado, erro)
+
+    if failed:
+        print(f"⚠️ {len(failed)} arquivo(s) com falha: {', '.join(failed)}")
+
+    if not writer.n_rows:
+        print("❌ Nenhum resultado encontrado.")
+        return
+
+    print(f"✅ {fmt.upper()} gerado: {writer.output_path}")
 
 
 # ---------- main -------------------------------------------------------
 def main():
+    parser = argparse.ArgumentParser(description="Extrai resultados laboratoriais de laudos PDF/TXT.")
     # Set your directory path here
-    pasta = "/Users/nicholasloureiro/Downloads/amostra 2" # <-- CHANGE THIS TO YOUR PDF/TXT DIRECTORY
-    
-    if not os.path.isdir(pasta):
-        print(f"❌ Diretório '{pasta}' inválido ou não encontrado!")
+    parser.add_argument(
+        "pasta", nargs="?",
+        default="/Users/nicholasloureiro/Downloads/amostra 2", # <-- CHANGE THIS TO YOUR PDF/TXT DIRECTORY
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=1,
+        help="Processos em paralelo (0 = todos os núcleos). Padrão: 1 (serial).",
+    )
+    parser.add_argument("-f", "--format", choices=["csv", "parquet"], default="csv", dest="fmt")
+    parser.add_argument(
+        "--layout", choices=["wide", "long"], default="wide",
+        help="wide: um paciente por linha; long: uma linha por paciente × exame (só Parquet).",
+    )
+    parser.add_argument(
+        "--cache", nargs="?", const=DEFAULT_CACHE_PATH, default=None, metavar="ARQUIVO",
+        help=f"Reaproveita extrações anteriores pelo hash do arquivo (padrão: {DEFAULT_CACHE_PATH}).",
+    )
+    parser.add_argument(
+        "--pages", choices=PAGE_MODES, default="all",
+        help="Páginas extraídas dos PDFs: all; content (pula cabeçalho/assinatura/método); anchors (só páginas com exames).",
+    )
+    parser.add_argument(
+        "--backend", choices=list(TEXT_BACKENDS), default="words",
+        help="Extração de texto do PDF: words (ordena palavras) ou lines (reflow por linha, mais rápido).",
+    )
+    parser.add_argument(
+        "--pipeline", choices=["pool", "async"], default="pool",
+        help="pool: arquivo inteiro por tarefa; async: leitura, PDF e regex em estágios sobrepostos (disco lento/rede).",
+    )
+    parser.add_argument("--prefetch", type=int, default=8, help="Arquivos lidos à frente no pipeline async.")
+    parser.add_argument("-o", "--output", default=None, help="Arquivo de saída (padrão: all_lab_results.<formato>).")
+    args = parser.parse_args()
+
+    pasta = args.pasta
+    workers = args.workers or os.cpu_count() or 1
+
+    try:
+        corpus_kind(pasta)
+    except (OSError, ValueError):
+        print(f"❌ Diretório (ou ZIP/tar/.pack) '{pasta}' inválido ou não encontrado!")
         print("Por favor, atualize a variável 'pasta' no script com o caminho correto.")
         return
-    process_directory(pasta)
+    process_directory(pasta, workers=workers, output_path=args.output, fmt=args.fmt, layout=args.layout,
+                      cache_path=args.cache, pages=args.pages, backend=args.backend,
+                      pipeline=args.pipeline, prefetch=args.prefetch)
 
 
 if __name__ == "__main__":
@@ -1,21 +1,35 @@
 # update_ref_values.py
-import re, zipfile, json
+import os, re, json, argparse
 from collections import Counter, defaultdict
 from pathlib import Path
-from ref_values import REF_VALUES
-
+from corpus_reader import iter_members, map_chunks, read_member_bytes
 
+# Mineração das faixas de referência impressas nos laudos:
+#   python update_ref_values.py [corpus] -w 8
+# O corpus (pasta, ZIP, tar ou .pack) é dividido em lotes entre processos;
+# cada lote devolve só um Counter por exame com as faixas (lo, hi, unidade)
+# vistas, e os Counters são somados no fim — a memória cresce com o número
+# de faixas distintas, não com o tamanho do arquivo histórico.
+# Além da faixa mais comum ("modo") de cada exame, o relatório traz o suporte
+# (quantas vezes ela apareceu e que fração das ocorrências isso representa)
+# e as faixas conflitantes.
 
 # --------------------------------------------------------------------------
-ZIP_PATH = Path(__file__).with_name("txt_anonimizadosz.zip")
+ZIP_PATH = Path(__file__).with_name("txt_anonimizadosz.zip")   # pasta, ZIP, tar ou .pack
+OUTPUT_PATH = Path("ref_values_updated.json")
+REPORT_PATH = Path("ref_ranges_report.json")
+MINE_CHUNKSIZE = 256       # laudos por tarefa do pool
+MAX_CONFLICTS = 5          # faixas alternativas listadas por exame no relatório
 
 _range_re  = re.compile(r"(\d+[.,]?\d*)\s*a\s*(\d+[.,]?\d*)")
 _multispc  = re.compile(r"\s{2,}")                      # 2+ espaços
 _unit_re   = re.compile(r"[^\s\d].*")                  # 1ª “palavra” não numérica depois do intervalo
+_numeric_re = re.compile(r"[\d,\.]+")
 
-def extract_ranges(txt: str):
-    """Yield (exam_name, lo, hi, unit) tuples found in one txt string."""
-    for line in txt.splitlines():
+def extract_ranges(txt):
+    """Yield (exam_name, lo, hi, unit) tuples found in one txt string (or an iterable of lines)."""
+    lines = txt.splitlines() if isinstance(txt, str) else txt
+    for line in lines:
         if " a " not in line:
             continue
         m = _range_re.search(line)
@@ -28,7 +42,7 @@ def extract_ranges(txt: str):
         if mt:
             tok = mt.group(0).split()[0]
             # ignora tokens só numéricos (ex.: “11,0” de RDW)
-            if re.fullmatch(r"[\d,\.]+", tok):
+            if _numeric_re.fullmatch(tok):
                 unit = "%"
             else:
                 unit = tok
@@ -38,37 +52,99 @@ def extract_ranges(txt: str):
             yield exam, lo, hi, unit
 
 # --------------------------------------------------------------------------
-# 2) Lê todos os .txt do ZIP
-raw_ranges = defaultdict(list)
-with zipfile.ZipFile(ZIP_PATH) as zf:
-    for name in zf.namelist():
-        if name.endswith(".txt"):
-            txt = zf.read(name).decode("utf-8", errors="ignore")
-            for exam, lo, hi, unit in extract_ranges(txt):
-                raw_ranges[exam].append((round(lo, 2), round(hi, 2), unit))
+# 1) Mineração: um Counter por exame em cada lote, somados no fim
+def _mine_chunk(members):
+    """Roda no pool: {exame: Counter((lo, hi, unidade))} de um lote de laudos."""
+    counts = defaultdict(Counter)
+    for member in members:
+        # str.splitlines() como no minerador original: \x0c (quebra de página
+        # do PDF), \x1c-\x1e e \x85 também separam linhas
+        txt = read_member_bytes(member).decode("utf-8", errors="ignore")
+        for exam, lo, hi, unit in extract_ranges(txt):
+            counts[exam][(round(lo, 2), round(hi, 2), unit)] += 1
+    return counts
+
+def mine_ranges(corpus_path=ZIP_PATH, workers: int = 1, chunksize: int = MINE_CHUNKSIZE):
+    """
+    Faixas de referência de todos os .txt do corpus: {exame: Counter((lo, hi, unidade))}.
+    Os lotes são somados na ordem do corpus (no ZIP, a ordem do arquivo, não
+    a alfabética), então empates no modo continuam resolvidos pela faixa vista
+    primeiro, como no minerador original.
+    """
+    totals = defaultdict(Counter)
+    members = iter_members(str(corpus_path), extensions=(".txt",), sort=False)
+    for counts in map_chunks(_mine_chunk, members, workers=workers, chunksize=chunksize):
+        for exam, counter in counts.items():
+            totals[exam].update(counter)
+    return totals
+
+# 2) Escolhe o intervalo mais comum (“modo”) para cada exame, com suporte e conflitos
+def range_report(totals, max_conflicts: int = MAX_CONFLICTS):
+    """{exame: faixa escolhida + suporte, ocorrências, concordância e faixas conflitantes}."""
+    report = {}
+    for exam, counter in totals.items():
+        ranked = counter.most_common()
+        (lo, hi, unit), support = ranked[0]
+        total = sum(counter.values())
+        report[exam] = {
+            "ref_min": lo, "ref_max": hi, "unit": unit,
+            "suporte": support,
+            "ocorrencias": total,
+            "concordancia": round(support / total, 4),
+            "conflitos": [
+                {"ref_min": c_lo, "ref_max": c_hi, "unit": c_unit, "suporte": n}
+                for (c_lo, c_hi, c_unit), n in ranked[1:1 + max_conflicts]
+            ],
+        }
+    return report
 
-# 3) Escolhe o intervalo mais comum (“modo”) para cada exame
-clean_ranges = {}
-for exam, lst in raw_ranges.items():
-    (lo, hi, unit), _ = Counter(lst).most_common(1)[0]
-    clean_ranges[exam] = {"ref_min": lo, "ref_max": hi, "unit": unit}
+def clean_ranges(report):
+    """Só a faixa escolhida de cada exame."""
+    return {exam: {"ref_min": r["ref_min"], "ref_max": r["ref_max"], "unit": r["unit"]} for exam, r in report.items()}
 
-# 4) Converte REF_VALUES original → dict para atualizar
-ref_dict = {k.upper(): v for k, v in REF_VALUES}
+# 3) Atualiza / acrescenta sobre o REF_VALUES original e volta a lista ordenada
+def update_ref_values(ref_values, ranges):
+    ref_dict = {k.upper(): v for k, v in ref_values}
+    for exam, rng in ranges.items():
+        if exam in ref_dict:
+            ref_dict[exam].update(rng)          # sobrescreve apenas se mudou
+        else:
+            ref_dict[exam] = rng                # acrescenta novo exame
+    return sorted(ref_dict.items(), key=lambda x: x[0])
+
+def build_updated_ref_values(corpus_path=ZIP_PATH, workers: int = 1, ref_values=None):
+    """Minera o corpus e aplica sobre `ref_values`. Retorna (lista atualizada, relatório)."""
+    if ref_values is None:
+        from ref_values import REF_VALUES
+        ref_values = REF_VALUES
+    report = range_report(mine_ranges(corpus_path, workers))
+    return update_ref_values(ref_values, clean_ranges(report)), report
+
+# --------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Minera as faixas de referência impressas nos laudos TXT.")
+    parser.add_argument("corpus", nargs="?", default=str(ZIP_PATH), help="Pasta, ZIP, tar ou .pack com os TXT.")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Processos em paralelo (0 = todos os núcleos).")
+    parser.add_argument("-o", "--output", default=str(OUTPUT_PATH))
+    parser.add_argument("--report", default=str(REPORT_PATH), help="Suporte e faixas conflitantes por exame.")
+    args = parser.parse_args()
 
-# 5) Atualiza / acrescenta
-for exam, rng in clean_ranges.items():
-    if exam in ref_dict:
-        ref_dict[exam].update(rng)          # sobrescreve apenas se mudou
-    else:
-        ref_dict[exam] = rng                # acrescenta novo exame
+    workers = args.workers or os.cpu_count() or 1
+    updated, report = build_updated_ref_values(args.corpus, workers)
 
-# 6) Volta a lista ordenada
-UPDATED_REF_VALUES = sorted(ref_dict.items(), key=lambda x: x[0])
+    # Salva em JSON p/ auditoria rápida (opcional)
+    Path(args.output).write_text(json.dumps(updated, indent=2, ensure_ascii=False))
+    Path(args.report).write_text(json.dumps(report, indent=2, ensure_ascii=False))
 
-# 7) Salva em JSON p/ auditoria rápida (opcional)
-Path("ref_values_updated.json").write_text(json.dumps(UPDATED_REF_VALUES, indent=2, ensure_ascii=False))
+    # Mostra pré-via
+    for exam, rng in updated[:25]:
+        print(f"{exam:<35} {rng}")
+    conflicting = sorted((r["concordancia"], exam) for exam, r in report.items() if r["conflitos"])
+    print(f"\n⚠️ {len(conflicting)} de {len(report)} exame(s) com faixas conflitantes; menor concordância:")
+    for share, exam in conflicting[:10]:
+        r = report[exam]
+        print(f"  {exam:<35} {r['suporte']}/{r['ocorrencias']} ({100 * share:.0f}%)")
+    print(f"✅ {args.output} e {args.report} gravados")
 
-# 8) Mostra pré-via
-for exam, rng in UPDATED_REF_VALUES[:25]:
-    print(f"{exam:<35} {rng}")
+if __name__ == "__main__":
+    main()